@@ -0,0 +1,200 @@
+"""
+Attribution automatique des salles.
+
+generer_salles_automatiques() applique la règle métier sur une liste de
+cours. Comme les salles ne sont réservées que par (date, demi-journée),
+l'attribution d'un jour ne dépend d'aucun autre : allouer_en_parallele()
+découpe l'année par jour (ou par semaine) et répartit les lots sur un pool
+de processus, avec un résultat identique à un passage séquentiel.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from creneaux import periode
+
+# en dessous, le coût de démarrage des processus dépasse le gain
+SEUIL_PARALLELE = 20000
+CHAMPS = ("date", "heure_debut", "heure_fin", "matiere_nom", "formation", "salle")
+
+
+def generer_salles_automatiques(cours, salles, effectifs, access=None, occupees=None):
+    """
+    RÈGLE MÉTIER :
+    - mêmes date + horaires + matière => salle partagée possible
+    - capacité >= somme des effectifs
+    - UNE SALLE = UNE SEULE FOIS PAR DEMI-JOURNÉE (MATIN / APRES-MIDI)
+
+    occupees : {(date, periode): set(code_salle)} déjà prises par des cours
+    qui ne figurent pas dans `cours` (et gardent leur salle).
+    """
+
+    if not salles:
+        return
+
+    if access is None:
+        access = {}
+
+    # salles déjà utilisées par (date, période)
+    salles_utilisees = {cle: set(codes) for cle, codes in (occupees or {}).items()}
+
+    # ----------------------
+    # regroupement par cours réel
+    # ----------------------
+    groupes = {}
+    for c in cours:
+        key = (
+            c["date"],
+            c["heure_debut"],
+            c["heure_fin"],
+            c["matiere_nom"]
+        )
+        groupes.setdefault(key, []).append(c)
+
+    # ----------------------
+    # attribution
+    # ----------------------
+    for groupe in groupes.values():
+
+        date = groupe[0]["date"]
+        periode_jour = periode(groupe[0]["heure_debut"])
+        cle = (date, periode_jour)
+
+        salles_utilisees.setdefault(cle, set())
+
+        formations = {c["formation"] for c in groupe}
+        total = sum(effectifs.get(f, 0) for f in formations)
+
+        besoin_accessible = any(access.get(f, False) for f in formations)
+
+        # 1️⃣ tentative salle commune
+        salle_commune = None
+        for s in salles:
+            if besoin_accessible and s["accessible"] != "OUI":
+                continue
+            if s["capacite"] < total:
+                continue
+            if s["code"] in salles_utilisees[cle]:
+                continue
+
+            salle_commune = s["code"]
+            break
+
+        if salle_commune:
+            for c in groupe:
+                c["salle"] = salle_commune
+            salles_utilisees[cle].add(salle_commune)
+            continue
+
+        # 2️⃣ sinon : une salle par formation (TOUJOURS même règle)
+        for c in groupe:
+            eff = effectifs.get(c["formation"], 0)
+            besoin_accessible_f = access.get(c["formation"], False)
+
+            for s in salles:
+                if besoin_accessible_f and s["accessible"] != "OUI":
+                    continue
+                if s["capacite"] < eff:
+                    continue
+                if s["code"] in salles_utilisees[cle]:
+                    continue
+
+                c["salle"] = s["code"]
+                salles_utilisees[cle].add(s["code"])
+                break
+            else:
+                # aucune salle possible : l'ancienne (devenue invalide ou
+                # réattribuée à un autre groupe) ne doit pas rester
+                c["salle"] = None
+
+
+# ======================
+# ALLOCATION PARALLÈLE
+# ======================
+
+_pool = None
+_pool_cle = None
+
+
+def nb_workers():
+    try:
+        return max(1, int(os.environ.get("PLANNING_ALLOCATION_WORKERS", "")))
+    except ValueError:
+        return os.cpu_count() or 1
+
+
+def _executor(workers):
+    # un pool par processus (les workers gunicorn sont forkés)
+    global _pool, _pool_cle
+    if _pool is None or _pool_cle != (os.getpid(), workers):
+        if _pool is not None and _pool_cle[0] == os.getpid():
+            _pool.shutdown(wait=False)
+        methodes = multiprocessing.get_all_start_methods()
+        contexte = multiprocessing.get_context("forkserver" if "forkserver" in methodes else "spawn")
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=contexte)
+        _pool_cle = (os.getpid(), workers)
+    return _pool
+
+
+def cle_lot(jour, par="jour"):
+    if par == "semaine":
+        annee, semaine, _ = date.fromisoformat(jour).isocalendar()
+        return (annee, semaine)
+    return jour
+
+
+def _allouer_lot(args):
+    cours, salles, effectifs, access, occupees = args
+    generer_salles_automatiques(cours, salles, effectifs, access, occupees)
+    return [c.get("salle") for c in cours]
+
+
+def salles_occupees(cours, jours=None):
+    """{(date, periode): set(code_salle)} des cours qui ont une salle (des jours indiqués)."""
+    occupees = {}
+    for c in cours:
+        if c.get("salle") and (jours is None or c["date"] in jours):
+            occupees.setdefault((c["date"], periode(c["heure_debut"])), set()).add(c["salle"])
+    return occupees
+
+
+def allouer_en_parallele(cours, salles, effectifs, access=None, par="jour", workers=None, occupees=None):
+    """
+    Même effet que generer_salles_automatiques(cours, ...), calculé par lots
+    (jour ou semaine) dans un pool de processus. Les salles sont réécrites
+    dans les dictionnaires de `cours`, dans le même ordre qu'en séquentiel.
+    """
+    workers = workers or nb_workers()
+    if not salles:
+        return
+    if workers <= 1 or len(cours) < SEUIL_PARALLELE:
+        generer_salles_automatiques(cours, salles, effectifs, access, occupees)
+        return
+
+    # partition : l'ordre des cours est conservé dans chaque lot
+    lots = {}
+    for i, c in enumerate(cours):
+        lots.setdefault(cle_lot(c["date"], par), []).append(i)
+
+    # regroupement des petits lots pour limiter les échanges entre processus
+    taille = max(1, len(lots) // (workers * 4))
+    paquets = []
+    for n, indices in enumerate(lots.values()):
+        if n % taille == 0:
+            paquets.append([])
+        paquets[-1].extend(indices)
+
+    occupees = occupees or {}
+    taches = []
+    for indices in paquets:
+        jours = {cours[i]["date"] for i in indices}
+        taches.append((
+            [{k: cours[i].get(k) for k in CHAMPS} for i in indices], salles, effectifs, access,
+            {cle: codes for cle, codes in occupees.items() if cle[0] in jours}
+        ))
+
+    for indices, resultat in zip(paquets, _executor(workers).map(_allouer_lot, taches)):
+        for i, salle in zip(indices, resultat):
+            cours[i]["salle"] = salle
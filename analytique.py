@@ -0,0 +1,177 @@
+"""
+Statistiques d'utilisation des salles.
+
+Les cours de l'année sont projetés dans deux tenseurs NumPy
+(salle × jour × créneau) : l'occupation (salle réservée ou non) et le
+remplissage (effectif présent / capacité). Tous les agrégats sont ensuite
+obtenus par des réductions vectorisées.
+"""
+
+import numpy as np
+
+from creneaux import MIDI, NB_CRENEAUX, creneaux, etendue_reservation, periode
+
+OUVERTURE = (8 * 60 + 30, 17 * 60 + 30)
+
+SEUIL_INOCCUPEE = 0.20
+SEUIL_SATUREE = 0.85
+
+
+def _tenseur(r, d, k0, k1, poids, forme):
+    """Somme de `poids` sur les intervalles de créneaux [k0, k1[ (par différences cumulées)."""
+    R, D, S = forme
+    delta = np.zeros((R, D, S + 1), dtype=np.float64)
+    np.add.at(delta, (r, d, k0), poids)
+    np.add.at(delta, (r, d, k1), -poids)
+    return np.cumsum(delta, axis=2)[:, :, :S]
+
+
+def calculer(cours, salles, effectifs, nb_pics=10):
+    codes = [s["code"] for s in salles]
+    rang = {c: i for i, c in enumerate(codes)}
+    capacites = np.array([s["capacite"] for s in salles], dtype=np.float64)
+
+    dates_cours = sorted({c["date"] for c in cours})
+    if not dates_cours or not salles:
+        return None
+
+    # jours ouvrés de la période + jours de cours éventuels hors semaine
+    jours = np.arange(np.datetime64(dates_cours[0]), np.datetime64(dates_cours[-1]) + 1)
+    jours = jours[np.is_busday(jours) | np.isin(jours, np.array(dates_cours, dtype="datetime64[D]"))]
+    index_jour = {str(j): i for i, j in enumerate(jours)}
+
+    # ----------------------
+    # vectorisation des cours
+    # une formation compte une seule fois par salle et demi-journée
+    # ----------------------
+    places = {}      # {(salle, jour, periode, formation): [k0, k1, effectif]}
+    non_places = {}  # {(jour, periode, formation): [k0, k1, effectif]}
+    non_places_formation = {}
+    non_places_jour = {}
+
+    for c in cours:
+        try:
+            k0, k1 = etendue_reservation(c["heure_debut"], c["heure_fin"])
+            per = periode(c["heure_debut"])
+        except (ValueError, KeyError):
+            continue
+        d = index_jour[c["date"]]
+        salle = (c.get("salle") or "").strip()
+
+        if not salle:
+            non_places_formation[c["formation"]] = non_places_formation.get(c["formation"], 0) + 1
+            non_places_jour[d] = non_places_jour.get(d, 0) + 1
+            cle = (d, per, c["formation"])
+            table = non_places
+        elif salle in rang:
+            cle = (rang[salle], d, per, c["formation"])
+            table = places
+        else:
+            continue
+
+        if cle in table:
+            table[cle][0] = min(table[cle][0], k0)
+            table[cle][1] = max(table[cle][1], k1)
+        else:
+            table[cle] = [k0, k1, effectifs.get(c["formation"], 0)]
+
+    R, D = len(salles), len(jours)
+    S = NB_CRENEAUX
+
+    if places:
+        r = np.fromiter((k[0] for k in places), dtype=np.int64, count=len(places))
+        d = np.fromiter((k[1] for k in places), dtype=np.int64, count=len(places))
+        vals = np.array(list(places.values()), dtype=np.int64)
+        k0, k1, eff = vals[:, 0], vals[:, 1], vals[:, 2].astype(np.float64)
+    else:
+        r = d = k0 = k1 = np.zeros(0, dtype=np.int64)
+        eff = np.zeros(0)
+
+    occupation = _tenseur(r, d, k0, k1, np.ones(len(r)), (R, D, S)) > 0
+    presents = _tenseur(r, d, k0, k1, eff, (R, D, S))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        remplissage = np.where(capacites[:, None, None] > 0, presents / capacites[:, None, None], 0.0)
+
+    # demande non satisfaite (jour × créneau)
+    attente = np.zeros((D, S + 1))
+    if non_places:
+        np_d = np.array([k[0] for k in non_places], dtype=np.int64)
+        np_k = np.array(list(non_places.values()), dtype=np.int64)
+        np.add.at(attente, (np_d, np_k[:, 0]), 1)
+        np.add.at(attente, (np_d, np_k[:, 1]), -1)
+    attente = np.cumsum(attente, axis=1)[:, :S]
+
+    # ----------------------
+    # agrégats sur les heures d'ouverture
+    # ----------------------
+    s0, s1 = creneaux(*OUVERTURE)
+    midi = creneaux(MIDI, MIDI)[0]
+
+    occ = occupation[:, :, s0:s1]
+    taux = occ.mean(axis=(1, 2))
+    taux_matin = occupation[:, :, s0:midi].mean(axis=(1, 2))
+    taux_apres_midi = occupation[:, :, midi:s1].mean(axis=(1, 2))
+
+    rempli = remplissage[:, :, s0:s1]
+    nb_occ = occ.sum(axis=(1, 2))
+    remplissage_moyen = np.divide(
+        (rempli * occ).sum(axis=(1, 2)), nb_occ,
+        out=np.zeros(R), where=nb_occ > 0
+    )
+
+    # semaines : lundi de chaque jour (le 01/01/1970 était un jeudi)
+    jours_num = jours.astype(np.int64)
+    lundis = jours - ((jours_num + 3) % 7).astype("timedelta64[D]")
+    semaines, inverse = np.unique(lundis, return_inverse=True)
+    par_jour = occ.sum(axis=2)                           # (R, D)
+    par_semaine = np.zeros((R, len(semaines)))
+    np.add.at(par_semaine.T, inverse, par_jour.T)
+    creneaux_semaine = np.bincount(inverse, minlength=len(semaines)) * (s1 - s0)
+    taux_semaine = par_semaine / creneaux_semaine
+
+    # pics de demande : salles occupées + groupes sans salle au même créneau
+    demande = occ.sum(axis=0) + attente[:, s0:s1]         # (D, S)
+    pic = demande.max(axis=1)
+    ordre = np.lexsort((jours_num, -pic))[:nb_pics]
+
+    def statut(t):
+        if t >= SEUIL_SATUREE:
+            return "saturée"
+        if t <= SEUIL_INOCCUPEE:
+            return "inoccupée"
+        return ""
+
+    return {
+        "salles": [{
+            "salle": codes[i],
+            "capacite": int(capacites[i]),
+            "taux": float(taux[i]),
+            "taux_matin": float(taux_matin[i]),
+            "taux_apres_midi": float(taux_apres_midi[i]),
+            "remplissage": float(remplissage_moyen[i]),
+            "statut": statut(taux[i])
+        } for i in range(R)],
+        "semaines": [str(s) for s in semaines],
+        "taux_semaine": taux_semaine.tolist(),
+        "pics": [{
+            "date": str(jours[j]),
+            "demande": int(pic[j]),
+            "salles": R,
+            "non_places": non_places_jour.get(int(j), 0)
+        } for j in ordre],
+        "non_places": {
+            "total": int(sum(non_places_formation.values())),
+            "par_formation": dict(sorted(non_places_formation.items()))
+        }
+    }
+
+
+def lignes_csv(rapport):
+    """Lignes de l'export CSV : une ligne par salle, une colonne par semaine."""
+    yield ["salle", "capacite", "taux", "taux_matin", "taux_apres_midi", "remplissage", "statut"] + rapport["semaines"]
+    for s, semaines in zip(rapport["salles"], rapport["taux_semaine"]):
+        yield [
+            s["salle"], s["capacite"],
+            f"{s['taux']:.3f}", f"{s['taux_matin']:.3f}", f"{s['taux_apres_midi']:.3f}",
+            f"{s['remplissage']:.3f}", s["statut"]
+        ] + [f"{t:.3f}" for t in semaines]
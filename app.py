@@ -1,10 +1,27 @@
-from flask import Flask, render_template, request, redirect, session, url_for
-from datetime import date, datetime
-import os, csv, json, io
+from flask import Flask, Response, render_template, request, redirect, send_file, session, url_for
+from datetime import date, datetime, timedelta
+from bisect import bisect_left
+from itertools import islice
+import os, csv, json, io, threading, hashlib, time
+
+from creneaux import to_minutes, en_heure, periode
+from occupation import IndexOccupation
+import analytique
+from taches import FileTaches
+from coordination import coordinateur, ecrire_json, version
+import simulation
+from allocation import generer_salles_automatiques, allouer_en_parallele, salles_occupees
+import stockage
+import archives
+import exports
+import compression
+from surveillance import Surveillant
+import click
 
 app = Flask(__name__)
 app.secret_key = "change_this_super_secret_key"
 app.secret_key = "cle-secrete-super-admin-2026"
+compression.installer(app)
 
 # ======================
 # PATHS
@@ -15,10 +32,7 @@ DATA_DIR = os.path.join(BASE_DIR, "data")
 REFERENCES = os.path.join(DATA_DIR, "references")
 OUTPUT = os.path.join(DATA_DIR, "output")
 IMPORTS = os.path.join(DATA_DIR, "imports")
-
-os.makedirs(IMPORTS, exist_ok=True)
-os.makedirs(REFERENCES, exist_ok=True)
-os.makedirs(OUTPUT, exist_ok=True)
+ARCHIVES = os.path.join(OUTPUT, "archives")
 
 # ======================
 # ANNÉE ACTIVE
@@ -38,16 +52,25 @@ def annee_path():
     def ensure(name, default):
         path = os.path.join(p, name)
         if not os.path.exists(path):
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(default, f, indent=2)
+            ecrire_json(path, default)
 
-    ensure("cours_planifies.json", [])
     ensure("verrou.json", {"verrouille": False})
     ensure("effectifs.json", {})
     ensure("accessibilite.json", {})
 
     return p
 
+def lister_annees():
+    """Années modifiables (dossiers de data/output) ; les années archivées n'y figurent plus."""
+    return sorted(
+        d for d in os.listdir(OUTPUT)
+        if d != "archives" and os.path.isdir(os.path.join(OUTPUT, d))
+    )
+
+def stock_courant():
+    """Cours de l'année active (partitions par formation, voir stockage.py)."""
+    return stockage.stock(annee_path())
+
 # ======================
 # UTILS
 # ======================
@@ -61,10 +84,34 @@ def safe_json(path, default):
     except (json.JSONDecodeError, IOError):
         return default
 
-def to_minutes(h):
-    h = h.replace("h", ":")
-    hh, mm = h.split(":")
-    return int(hh) * 60 + int(mm)
+def signature_fichier(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+_references = {}  # {path: (signature, contenu)}
+_references_lock = threading.Lock()
+
+def reference_cachee(path, lire):
+    """
+    Contenu d'un fichier de référence, relu seulement quand il change.
+    Partagé entre requêtes (et entre workers après --preload) : ne pas le modifier.
+    """
+    signature = signature_fichier(path)
+    with _references_lock:
+        deja = _references.get(path)
+        if deja is not None and deja[0] == signature:
+            return deja[1]
+    contenu = lire()
+    with _references_lock:
+        _references[path] = (signature, contenu)
+    return contenu
+
+def modifier_annee(fichier, fonction, defaut):
+    """Lecture-modification-écriture coordonnée d'un fichier de l'année active."""
+    return coordinateur.modifier(annee_path(), fichier, fonction, defaut)
 
 def normaliser_nom_formation(nom):
     nom = nom.upper()
@@ -103,8 +150,7 @@ def extraire_heures_du_texte(matiere_nom):
 
 FORMATIONS_PATH = os.path.join(REFERENCES, "formations.json")
 
-def charger_formations():
-    data = safe_json(FORMATIONS_PATH, {})
+def formations_propres(data):
     propres = {}
 
     for nom, infos in data.items():
@@ -122,139 +168,103 @@ def charger_formations():
                 int(infos.get("effectif", 0))
             )
 
-    with open(FORMATIONS_PATH, "w", encoding="utf-8") as f:
-        json.dump(propres, f, indent=2)
+    return propres
+
+def modifier_formations(fonction):
+    """Lecture-modification-écriture coordonnée de formations.json."""
+    return coordinateur.modifier(REFERENCES, "formations.json", fonction, {})
+
+def charger_formations():
+    data = safe_json(FORMATIONS_PATH, {})
+    propres = formations_propres(data)
+
+    if propres != data:
+        # nettoyage recalculé sur le contenu courant, sous verrou
+        def nettoyer(courant):
+            propres = formations_propres(courant)
+            courant.clear()
+            courant.update(propres)
+        modifier_formations(nettoyer)
 
     return [{"nom": n, "effectif": v["effectif"]} for n, v in propres.items()]
 
-def sauver_formations(formations):
-    with open(FORMATIONS_PATH, "w", encoding="utf-8") as f:
-        json.dump(
-            {f["nom"]: {"effectif": f["effectif"]} for f in formations},
-            f,
-            indent=2
-        )
+def ajouter_formation(nom, effectif=0):
+    """Ajoute la formation si aucune du même nom n'existe ; retourne True si ajoutée."""
+    def ajouter(formations):
+        if any(n.upper() == nom.upper() for n in formations):
+            return False
+        formations[nom] = {"effectif": effectif}
+        return True
+    return modifier_formations(ajouter)
+
+def retirer_formation(nom):
+    def retirer(formations):
+        for n in [n for n in formations if n.upper() == nom.upper()]:
+            del formations[n]
+    modifier_formations(retirer)
 
 # ======================
 # SALLES
 # ======================
 
+def lire_salles(f):
+    # Détecter le délimiteur
+    sample = f.read(1024)
+    f.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample)
+        delimiter = dialect.delimiter
+    except:
+        delimiter = "," if "," in sample else ";"
+    f.seek(0)
+    salles = list(csv.DictReader(f, delimiter=delimiter))
+    for s in salles:
+        s["capacite"] = int(s.get("capacite", 0))
+        s["accessible"] = s.get("accessible", "OUI").upper()
+    return sorted(salles, key=lambda x: x["capacite"])
+
 def charger_salles():
     path = os.path.join(REFERENCES, "salles.csv")
-    if not os.path.exists(path):
-        return []
 
-    try:
-        with open(path, encoding="utf-8-sig") as f:
-            # Détecter le délimiteur
-            sample = f.read(1024)
-            f.seek(0)
-            try:
-                dialect = csv.Sniffer().sniff(sample)
-                delimiter = dialect.delimiter
-            except:
-                delimiter = "," if "," in sample else ";"
-            f.seek(0)
-            salles = list(csv.DictReader(f, delimiter=delimiter))
-        for s in salles:
-            s["capacite"] = int(s.get("capacite", 0))
-            s["accessible"] = s.get("accessible", "OUI").upper()
-        return sorted(salles, key=lambda x: x["capacite"])
-    except (IOError, ValueError, KeyError):
-        return []
+    def lire():
+        if not os.path.exists(path):
+            return []
+        try:
+            with open(path, encoding="utf-8-sig") as f:
+                return lire_salles(f)
+        except (IOError, ValueError, KeyError):
+            return []
+
+    return reference_cachee(path, lire)
 
 # ======================
-# GÉNÉRATION DES SALLES
+# OCCUPATION DES SALLES
 # ======================
 
-def generer_salles_automatiques(cours, salles, effectifs, access=None):
+_occupation = {"cle_salles": None, "cle_cours": None, "index": None}
+_occupation_lock = threading.Lock()
+
+def index_occupation():
     """
-    RÈGLE MÉTIER :
-    - mêmes date + horaires + matière => salle partagée possible
-    - capacité >= somme des effectifs
-    - UNE SALLE = UNE SEULE FOIS PAR DEMI-JOURNÉE (MATIN / APRES-MIDI)
+    Index d'occupation (bitmaps salle × créneau) de l'année active.
+    Reconstruit entièrement si la liste des salles change, sinon seuls
+    les jours dont les affectations ont changé sont recalculés.
     """
+    base = annee_path()
+    cle_salles = (base, signature_fichier(os.path.join(REFERENCES, "salles.csv")))
+    cle_cours = version(base)
 
-    if not salles:
-        return
-
-    if access is None:
-        access = {}
-
-    # ----------------------
-    # utilitaire demi-journée
-    # ----------------------
-    def periode(h_debut):
-        return "MATIN" if to_minutes(h_debut) < 13 * 60 else "APRES_MIDI"
-
-    # salles déjà utilisées par (date, période)
-    salles_utilisees = {}  # {(date, periode): set(code_salle)}
-
-    # ----------------------
-    # regroupement par cours réel
-    # ----------------------
-    groupes = {}
-    for c in cours:
-        key = (
-            c["date"],
-            c["heure_debut"],
-            c["heure_fin"],
-            c["matiere_nom"]
-        )
-        groupes.setdefault(key, []).append(c)
-
-    # ----------------------
-    # attribution
-    # ----------------------
-    for groupe in groupes.values():
-
-        date = groupe[0]["date"]
-        periode_jour = periode(groupe[0]["heure_debut"])
-        cle = (date, periode_jour)
-
-        salles_utilisees.setdefault(cle, set())
-
-        formations = {c["formation"] for c in groupe}
-        total = sum(effectifs.get(f, 0) for f in formations)
-
-        besoin_accessible = any(access.get(f, False) for f in formations)
-
-        # 1️⃣ tentative salle commune
-        salle_commune = None
-        for s in salles:
-            if besoin_accessible and s["accessible"] != "OUI":
-                continue
-            if s["capacite"] < total:
-                continue
-            if s["code"] in salles_utilisees[cle]:
-                continue
-
-            salle_commune = s["code"]
-            break
-
-        if salle_commune:
-            for c in groupe:
-                c["salle"] = salle_commune
-            salles_utilisees[cle].add(salle_commune)
-            continue
-
-        # 2️⃣ sinon : une salle par formation (TOUJOURS même règle)
-        for c in groupe:
-            eff = effectifs.get(c["formation"], 0)
-            besoin_accessible_f = access.get(c["formation"], False)
-
-            for s in salles:
-                if besoin_accessible_f and s["accessible"] != "OUI":
-                    continue
-                if s["capacite"] < eff:
-                    continue
-                if s["code"] in salles_utilisees[cle]:
-                    continue
+    with _occupation_lock:
+        if _occupation["index"] is None or _occupation["cle_salles"] != cle_salles:
+            _occupation["index"] = IndexOccupation(charger_salles())
+            _occupation["cle_salles"] = cle_salles
+            _occupation["cle_cours"] = None
 
-                c["salle"] = s["code"]
-                salles_utilisees[cle].add(s["code"])
-                break
+        if _occupation["cle_cours"] != cle_cours:
+            _occupation["index"].synchroniser(stock_courant().cours())
+            _occupation["cle_cours"] = cle_cours
 
+        return _occupation["index"]
 
 # ======================
 # CSV → COURS
@@ -389,7 +399,9 @@ def parser_csv(path, formation):
 
 def charger_anniversaires():
     path = os.path.join(IMPORTS, "anniversaires.csv")
+    return reference_cachee(path, lambda: lire_anniversaires(path))
 
+def lire_anniversaires(path):
     if not os.path.exists(path):
         return []
 
@@ -461,6 +473,263 @@ def charger_anniversaires():
    
 
 
+# ======================
+# TÂCHES DE FOND
+# ======================
+
+# état des tâches partagé entre workers gunicorn (hors du dossier de l'année :
+# la progression n'invalide pas les caches des cours)
+taches = FileTaches(dossier=os.path.join(DATA_DIR, "taches"))
+
+def tache_import(tache, chemin, nom, forcer=False):
+    """Remplace la partition de la formation par le contenu du CSV."""
+    stock = stock_courant()
+    formation = normaliser_nom_formation(nom)
+    empreinte = stockage.hash_fichier(chemin)
+
+    if not forcer and stock.manifeste().get(formation, {}).get("hash_source") == empreinte:
+        return {"formation": formation, "cours": None, "inchange": True}
+
+    tache.avancer(0.1, f"Lecture de {os.path.basename(chemin)}")
+    nouveaux = parser_csv(chemin, nom)
+
+    tache.avancer(0.6, f"{len(nouveaux)} cours lus")
+    stock.remplacer_formation(
+        formation, nouveaux, source=os.path.basename(chemin), hash_source=empreinte,
+        motif=f"import {os.path.basename(chemin)}"
+    )
+
+    soumettre_allocation()
+    return {"formation": formation, "cours": len(nouveaux)}
+
+ALLOCATION = "allocation.json"  # empreinte des données lors de la dernière attribution
+
+def tache_allocation(tache, revalider=False):
+    """
+    Place les cours sans salle ; avec revalider, seulement ceux dont la salle
+    n'est plus valable (salles_invalides). Les autres salles, saisies dans
+    /preview comprises, restent en place et sont comptées comme prises.
+    """
+    base = annee_path()
+    salles = charger_salles()
+    effectifs = safe_json(os.path.join(base, "effectifs.json"), {})
+    access = safe_json(os.path.join(base, "accessibilite.json"), {})
+
+    def allouer(cours):
+        # sous verrou : l'allocation part de la dernière version écrite
+        resultat = {"cours": len(cours)}
+        if revalider:
+            invalides = set(salles_invalides(cours, salles, effectifs, access))
+            a_placer = [
+                c for c in cours
+                if c.get("salle") and (c["date"], periode(c["heure_debut"]), c["salle"]) in invalides
+            ]
+            for c in a_placer:
+                c["salle"] = None
+            resultat["invalides"] = len(invalides)
+        else:
+            a_placer = [c for c in cours if c.get("salle") is None]
+        occupees = salles_occupees(cours, {c["date"] for c in a_placer})
+
+        if a_placer:
+            tache.avancer(0.2, f"Attribution des salles ({len(a_placer)} cours)")
+            allouer_en_parallele(a_placer, salles, effectifs, access, occupees=occupees)
+        resultat["sans_salle"] = sum(1 for c in cours if c.get("salle") is None)
+        return resultat
+
+    stock = stock_courant()
+    motif = "réattribution des salles invalides" if revalider else "attribution automatique des salles"
+    resultat = stock.modifier(allouer, motif=motif)
+
+    # les cours encore sans salle n'en trouveront pas tant que rien ne change
+    empreinte = empreinte_allocation(stock)
+    def noter(etat):
+        etat.update({"empreinte": empreinte, "sans_salle": resultat["sans_salle"]})
+    modifier_annee(ALLOCATION, noter, {})
+    return resultat
+
+def empreinte_allocation(stock):
+    """Empreinte de ce dont dépend l'attribution : cours, salles, effectifs, accessibilité."""
+    base = annee_path()
+    donnees = [
+        {f: [i.get("hash_source"), i.get("lignes"), i.get("sans_salle")] for f, i in stock.etat_imports().items()},
+        [[s["code"], s["capacite"], s["accessible"]] for s in charger_salles()],
+        safe_json(os.path.join(base, "effectifs.json"), {}),
+        safe_json(os.path.join(base, "accessibilite.json"), {})
+    ]
+    return hashlib.sha1(json.dumps(donnees, sort_keys=True).encode()).hexdigest()
+
+def allocation_a_faire(stock):
+    """Des cours sans salle, et quelque chose a changé depuis la dernière attribution."""
+    if not stock.sans_salle():
+        return False
+    derniere = safe_json(os.path.join(annee_path(), ALLOCATION), {})
+    return derniere.get("empreinte") != empreinte_allocation(stock)
+
+def salles_invalides(cours, salles, effectifs, access):
+    """
+    Cours dont la salle ne respecte plus les effectifs ou l'accessibilité
+    (après une modification de /effectifs, /accessibilite ou de salles.csv).
+    """
+    par_code = {s["code"]: s for s in salles}
+    occupants = {}  # {(date, periode, salle): set(formations)}
+    for c in cours:
+        if c.get("salle") in par_code:
+            cle = (c["date"], periode(c["heure_debut"]), c["salle"])
+            occupants.setdefault(cle, set()).add(c["formation"])
+
+    invalides = []
+    for (d, p, code), formations in occupants.items():
+        s = par_code[code]
+        if s["capacite"] < sum(effectifs.get(f, 0) for f in formations):
+            invalides.append((d, p, code))
+        elif s["accessible"] != "OUI" and any(access.get(f, False) for f in formations):
+            invalides.append((d, p, code))
+    return invalides
+
+def tache_revalidation(tache):
+    base = annee_path()
+    cours = stock_courant().cours()
+    invalides = salles_invalides(
+        cours,
+        charger_salles(),
+        safe_json(os.path.join(base, "effectifs.json"), {}),
+        safe_json(os.path.join(base, "accessibilite.json"), {})
+    )
+    if not invalides:
+        return {"invalides": 0}
+
+    # seuls les cours de ces (date, demi-journée, salle) changent de salle
+    tache.avancer(0.3, f"{len(invalides)} salles à réattribuer")
+    return tache_allocation(tache, revalider=True)
+
+def nom_formation_fichier(nom_fichier):
+    """ "Emplois du temps 2025-2026 - SIO 1.csv" -> "SIO 1" """
+    nom = nom_fichier.split(".")[0].upper()
+    for x in ["EMPLOIS DU TEMPS", "EMPLOI DU TEMPS", "PLANNING", "2025-2026", "2026-2027"]:
+        nom = nom.replace(x, "")
+    return " ".join(nom.replace("-", " ").split())
+
+# CSV déposés dans data/imports qui ne sont pas des emplois du temps
+FICHIERS_HORS_PLANNING = {"anniversaires.csv"}
+
+def est_emploi_du_temps(nom_fichier):
+    """Seuls ces fichiers de data/imports deviennent des formations (import, surveillance)."""
+    nom = os.path.basename(nom_fichier).lower()
+    return nom.endswith(".csv") and nom not in FICHIERS_HORS_PLANNING
+
+def importer_fichier(chemin):
+    """
+    Ajoute la formation si besoin et met l'import du CSV en file d'attente.
+    Retourne None pour un fichier qui n'est pas un emploi du temps.
+    """
+    if not est_emploi_du_temps(chemin):
+        return None
+    nom = nom_formation_fichier(os.path.basename(chemin))
+    ajouter_formation(nom)
+    return taches.soumettre("import", tache_import, chemin, nom, cle=("import", chemin))
+
+def soumettre_allocation():
+    return taches.soumettre("allocation", tache_allocation, cle=("allocation", annee_path()))
+
+def soumettre_revalidation():
+    return taches.soumettre("revalidation", tache_revalidation, cle=("revalidation", annee_path()))
+
+@app.route("/taches")
+def taches_liste():
+    if not session.get("admin"):
+        return redirect("/login")
+    return {"taches": taches.liste()}
+
+@app.route("/taches/<id>")
+def taches_etat(id):
+    if not session.get("admin"):
+        return redirect("/login")
+    etat = taches.etat(id)
+    if etat is None:
+        return {"erreur": "tâche inconnue"}, 404
+    return etat
+
+# ======================
+# SURVEILLANCE DE data/imports
+# ======================
+
+INGESTIONS = "ingestions.json"  # {"fichiers": {nom: empreinte}, "journal": [...]}
+
+def noter_ingestion(entree, empreinte=None):
+    def noter(ingestions):
+        fichiers = ingestions.setdefault("fichiers", {})
+        if empreinte is None:
+            fichiers.pop(entree["fichier"], None)
+        else:
+            fichiers[entree["fichier"]] = empreinte
+        journal = ingestions.setdefault("journal", [])
+        journal.append({"date": datetime.now().isoformat(timespec="seconds"), **entree})
+        del journal[:-200]
+    modifier_annee(INGESTIONS, noter, {})
+
+def ingerer_fichier(chemin, empreinte):
+    nom = os.path.basename(chemin)
+    id_tache = importer_fichier(chemin)
+    noter_ingestion({
+        "fichier": nom, "formation": nom_formation_fichier(nom), "action": "import", "tache": id_tache
+    }, empreinte)
+
+def retirer_fichier(nom):
+    """CSV retiré du dossier : ses cours sont supprimés (l'historique permet de revenir en arrière)."""
+    stock = stock_courant()
+    formations = [f for f, infos in stock.manifeste().items() if infos.get("source") == nom]
+    for f in formations:
+        stock.supprimer_formation(f, motif=f"retrait de {nom} du dossier des imports")
+    noter_ingestion({"fichier": nom, "formation": ", ".join(formations) or None, "action": "retrait"})
+
+def fichiers_connus():
+    """
+    Empreintes déjà traitées. À la première mise en route, les CSV présents
+    servent de référence (ils ne sont pas réimportés) ; ensuite, les
+    changements faits pendant un arrêt sont rattrapés au démarrage.
+    """
+    path = os.path.join(annee_path(), INGESTIONS)
+    ingestions = safe_json(path, None)
+    if ingestions is not None:
+        return ingestions.get("fichiers", {})
+
+    fichiers = {
+        nom: stockage.hash_fichier(os.path.join(IMPORTS, nom))
+        for nom in os.listdir(IMPORTS) if est_emploi_du_temps(nom)
+    }
+    modifier_annee(INGESTIONS, lambda i: i.setdefault("fichiers", {}).update(fichiers), {})
+    return fichiers
+
+surveillant = Surveillant(
+    IMPORTS, ingerer_fichier, retirer_fichier, fichiers_connus,
+    intervalle=float(os.environ.get("PLANNING_SURVEILLANCE_INTERVALLE", 2)),
+    delai=float(os.environ.get("PLANNING_SURVEILLANCE_DELAI", 3)),
+    retenir=est_emploi_du_temps
+)
+
+@app.before_request
+def demarrer_surveillance():
+    # optionnelle : PLANNING_SURVEILLER_IMPORTS=1
+    if os.environ.get("PLANNING_SURVEILLER_IMPORTS") == "1":
+        surveillant.demarrer()
+
+@app.cli.command("surveiller")
+def surveiller_commande():
+    """Surveille data/imports au premier plan (sans serveur web)."""
+    click.echo(f"Surveillance de {IMPORTS} (Ctrl+C pour arrêter)")
+    surveillant.boucle()
+
+@app.route("/imports/ingestions")
+def imports_ingestions():
+    if not session.get("admin"):
+        return redirect("/login")
+    ingestions = safe_json(os.path.join(annee_path(), INGESTIONS), {})
+    return {
+        "active": os.environ.get("PLANNING_SURVEILLER_IMPORTS") == "1",
+        "journal": list(reversed(ingestions.get("journal", [])))
+    }
+
 # ======================
 # INDEX
 # ======================
@@ -471,9 +740,6 @@ def index():
         return redirect("/login")
 
     base = annee_path()
-    cours_path = os.path.join(base, "cours_planifies.json")
-    cours = safe_json(cours_path, [])
-
     formations = charger_formations()
 
     effectifs_path = os.path.join(base, "effectifs.json")
@@ -482,54 +748,79 @@ def index():
     effectifs = safe_json(effectifs_path, {})
     access = safe_json(access_path, {})
 
-    for f in formations:
-        effectifs.setdefault(f["nom"], f["effectif"])
-        access.setdefault(f["nom"], False)
-
-    with open(effectifs_path, "w", encoding="utf-8") as f:
-        json.dump(effectifs, f, indent=2)
-    with open(access_path, "w", encoding="utf-8") as f:
-        json.dump(access, f, indent=2)
-
-    formations_importees = {normaliser_nom_formation(c["formation"]) for c in cours}
-
-    rapport = [{
-        "formation": f["nom"],
-        "statut": "OK" if normaliser_nom_formation(f["nom"]) in formations_importees else "Aucun cours"
+    # compléter les formations manquantes (écriture seulement si nécessaire)
+    if any(f["nom"] not in effectifs for f in formations):
+        def completer_effectifs(effectifs):
+            for f in formations:
+                effectifs.setdefault(f["nom"], f["effectif"])
+        modifier_annee("effectifs.json", completer_effectifs, {})
+        effectifs = safe_json(effectifs_path, {})
 
-    } for f in formations]
+    if any(f["nom"] not in access for f in formations):
+        def completer_access(access):
+            for f in formations:
+                access.setdefault(f["nom"], False)
+        modifier_annee("accessibilite.json", completer_access, {})
+        access = safe_json(access_path, {})
 
     if request.method == "POST":
         f = request.files.get("csv_file")
         if f:
-            f.save(os.path.join(IMPORTS, f.filename))
-
-            raw = f.filename.split(".")[0].upper()
-            nom = raw
-            for x in ["EMPLOIS DU TEMPS", "EMPLOI DU TEMPS", "PLANNING", "2025-2026", "2026-2027"]:
-                nom = nom.replace(x, "")
-            nom = " ".join(nom.replace("-", " ").split())
-
-            if nom not in [x["nom"] for x in formations]:
-                formations.append({"nom": nom, "effectif": 0})
-                sauver_formations(formations)
-
-            cours.extend(parser_csv(os.path.join(IMPORTS, f.filename), nom))
-            with open(cours_path, "w", encoding="utf-8") as file:
-                json.dump(cours, file, indent=2)
+            chemin = os.path.join(IMPORTS, f.filename)
+            f.save(chemin)
+            id_tache = importer_fichier(chemin)
+            return redirect(f"/?tache={id_tache}" if id_tache else "/")
 
         return redirect("/")
 
     return render_template(
         "index.html",
         formations=formations,
-        rapport=rapport,
+        rapport=rapport_imports(formations),
         effectifs=effectifs,
         access=access,
         verrou=safe_json(os.path.join(base, "verrou.json"), {"verrouille": False}),
+        tache=request.args.get("tache"),
+        annees=lister_annees(),
+        annee=get_annee_active(),
         erreur=None
     )
 
+def rapport_imports(formations):
+    """Statut d'import de chaque formation, lu dans le manifeste (pas de passe sur les cours)."""
+    etat = {normaliser_nom_formation(f): infos for f, infos in stock_courant().etat_imports().items()}
+    rapport = []
+    for f in formations:
+        infos = etat.get(normaliser_nom_formation(f["nom"]), {})
+        rapport.append({
+            "formation": f["nom"],
+            "statut": "OK" if infos.get("lignes") else "Aucun cours",
+            "cours": infos.get("lignes", 0),
+            "debut": infos.get("debut"),
+            "fin": infos.get("fin"),
+            "sans_salle": infos.get("sans_salle", 0),
+            "source": infos.get("source"),
+            "hash_source": infos.get("hash_source"),
+            "importe_le": infos.get("importe_le")
+        })
+    return rapport
+
+@app.route("/etat")
+def etat_imports():
+    if not session.get("admin"):
+        return redirect("/login")
+
+    return render_template("etat.html", rapport=rapport_imports(charger_formations()))
+
+@app.route("/changer_annee/<annee>")
+def changer_annee(annee):
+    if not session.get("admin"):
+        return redirect("/login")
+
+    if annee in lister_annees():
+        coordinateur.remplacer(OUTPUT, "annee_active.json", {"annee": annee})
+    return redirect("/")
+
 # ======================
 # PREVIEW
 # ======================
@@ -539,33 +830,18 @@ def preview():
     if not session.get("admin"):
         return redirect("/login")
 
-    base = annee_path()
-    cours_path = os.path.join(base, "cours_planifies.json")
-    cours = safe_json(cours_path, [])
+    stock = stock_courant()
     today = date.today()
 
-    salles = charger_salles()
-    effectifs = safe_json(os.path.join(base, "effectifs.json"), {})
-    access = safe_json(os.path.join(base, "accessibilite.json"), {})
-
     # Générer automatiquement les salles seulement si elles ne sont pas déjà assignées
-    if any(c.get("salle") is None for c in cours):
-        try:
-            generer_salles_automatiques(cours, salles, effectifs, access)
-            # Sauvegarder les salles générées
-            with open(cours_path, "w", encoding="utf-8") as file:
-                json.dump(cours, file, indent=2)
-        except Exception as e:
-            print(f"ERREUR generer_salles_automatiques: {e}")
-            import traceback
-            traceback.print_exc()
-
-    par_date = {}
-    for c in cours:
-        d = datetime.strptime(c["date"], "%Y-%m-%d").date()
-        par_date.setdefault(d, []).append(c)
+    # (en tâche de fond : la page affiche l'état courant sans attendre)
+    # (une fois par changement : certains cours n'ont aucune salle possible ;
+    # pas sur un envoi du formulaire, dont les saisies passent en premier)
+    allocation = None
+    if request.method == "GET" and allocation_a_faire(stock):
+        allocation = soumettre_allocation()
 
-    jours = sorted(par_date)
+    jours = stock.dates()
 
     # =========================
     # 📅 DATE SÉLECTIONNÉE (CALENDRIER)
@@ -579,28 +855,34 @@ def preview():
             jour = None
     else:
         # COMPORTEMENT ACTUEL (NE CHANGE RIEN)
-        jour = next((d for d in jours if d > today), None)
+        i = bisect_left(jours, (today.isoformat() + "~"))
+        jour = date.fromisoformat(jours[i]) if i < len(jours) else None
 
-    if jour is None or jour not in par_date:
+    cours_jour = stock.cours_du_jour(jour.isoformat()) if jour else []
+    if not cours_jour:
         return "Aucun cours pour cette date"
 
     if request.method == "POST":
+        saisies = {}
         for key, salle in request.form.items():
             try:
                 d, f = key.split("|")
-                for c in cours:
-                    if c["date"] == d and c["formation"] == f:
-                        c["salle"] = salle.strip() or None
             except ValueError:
                 continue
+            saisies[(d, f)] = salle.strip() or None
+
+        def appliquer_saisies(cours):
+            for c in cours:
+                cle = (c["date"], c["formation"])
+                if cle in saisies:
+                    c["salle"] = saisies[cle]
 
-        with open(cours_path, "w", encoding="utf-8") as file:
-            json.dump(cours, file, indent=2)
+        stock.modifier(appliquer_saisies, formations={f for _, f in saisies}, motif=f"saisie des salles du {jour.isoformat()}")
         return redirect(f"/preview?date={jour.isoformat()}")
 
     matin, apresmidi = {}, {}
 
-    for c in par_date.get(jour, []):
+    for c in cours_jour:
         debut = to_minutes(c["heure_debut"])
         fin = to_minutes(c["heure_fin"])
         
@@ -618,35 +900,71 @@ def preview():
         "preview.html",
         date=jour.isoformat(),
         matin=list(matin.values()),
-        apresmidi=list(apresmidi.values())
+        apresmidi=list(apresmidi.values()),
+        allocation=allocation,
+        sans_salle=stock.sans_salle()
     )
 
 
+# ======================
+# HISTORIQUE
+# ======================
+
+@app.route("/historique")
+def historique_page():
+    if not session.get("admin"):
+        return redirect("/login")
+
+    versions = stock_courant().historique()
+    return render_template(
+        "historique.html",
+        versions=list(reversed(versions)),
+        courante=versions[-1]["n"] if versions else 0,
+        octets=sum(v["octets"] for v in versions)
+    )
+
+@app.route("/historique/diff")
+def historique_diff():
+    """?de=12&a=15 : changements des versions 13 à 15 (a par défaut : la dernière)."""
+    if not session.get("admin"):
+        return redirect("/login")
+
+    stock = stock_courant()
+    versions = stock.historique()
+    try:
+        a = int(request.args.get("a") or (versions[-1]["n"] if versions else 0))
+        de = int(request.args.get("de") or a - 1)
+    except ValueError:
+        return {"erreur": "version invalide"}, 400
+    return {"de": de, "a": a, "versions": stock.differences(min(de, a), max(de, a))}
+
+@app.route("/historique/restaurer/<int:n>", methods=["POST"])
+def historique_restaurer(n):
+    if not session.get("admin"):
+        return redirect("/login")
+
+    try:
+        stock_courant().restaurer(n)
+    except ValueError as e:
+        return str(e), 400
+    return redirect("/historique")
+
+
 # ======================
 # TV
 # ======================
 
 @app.route("/tv")
 def tv():
-    base = annee_path()
-    cours = safe_json(os.path.join(base, "cours_planifies.json"), [])
+    stock = stock_courant()
     today = date.today()
-
-    # regroupement par date
-    par_date = {}
-    for c in cours:
-        try:
-            d = datetime.strptime(c["date"], "%Y-%m-%d").date()
-            par_date.setdefault(d, []).append(c)
-        except Exception:
-            continue
-
-    jours = sorted(par_date)
+    jours = stock.dates()
 
     # 🔎 logique :
     # - aujourd’hui s’il y a cours
     # - sinon prochain jour de cours
-    jour = today if today in jours else next((d for d in jours if d > today), None)
+    i = bisect_left(jours, today.isoformat())
+    jour = date.fromisoformat(jours[i]) if i < len(jours) else None
 
     # 🔒 sécurité si aucun cours
     if jour is None:
@@ -678,7 +996,7 @@ def tv():
     # =========================
     matin, apresmidi = {}, {}
 
-    for c in par_date.get(jour, []):
+    for c in stock.cours_du_jour(jour.isoformat()):
         debut = to_minutes(c["heure_debut"])
         fin = to_minutes(c["heure_fin"])
 
@@ -717,6 +1035,400 @@ def tv():
 
 
 
+# ======================
+# API PLANNING (PÉRIODE)
+# ======================
+
+COLONNES_API = ["date", "heure_debut", "heure_fin", "formation", "matiere_nom", "salle"]
+LIMITE_API = 5000
+
+def periode_demandee(args):
+    """(du, au) depuis ?du=&au=, ?semaine=<un jour de la semaine> ou ?mois=AAAA-MM."""
+    if args.get("semaine"):
+        jour = datetime.strptime(args["semaine"], "%Y-%m-%d").date()
+        lundi = jour - timedelta(days=jour.weekday())
+        return lundi.isoformat(), (lundi + timedelta(days=6)).isoformat()
+    if args.get("mois"):
+        premier = datetime.strptime(args["mois"], "%Y-%m").date()
+        suivant = premier.replace(year=premier.year + premier.month // 12, month=premier.month % 12 + 1)
+        return premier.isoformat(), (suivant - timedelta(days=1)).isoformat()
+    du = datetime.strptime(args["du"], "%Y-%m-%d").date().isoformat() if args.get("du") else None
+    au = datetime.strptime(args["au"], "%Y-%m-%d").date().isoformat() if args.get("au") else None
+    return du, au
+
+@app.route("/api/cours")
+def api_cours():
+    """
+    Public, comme /tv :
+    /api/cours?semaine=2026-02-04&formation=SIO 1&formation=SIO 2
+    /api/cours?mois=2026-03&salle=B1     /api/cours?du=...&au=...&debut=500&limite=500
+    Les cours sont des lignes dans l'ordre de "colonnes" ; "suivant" donne
+    la valeur de debut de la page suivante (null à la dernière page).
+    """
+    args = request.args
+    try:
+        du, au = periode_demandee(args)
+        debut = max(int(args.get("debut") or 0), 0)
+        limite = min(max(int(args.get("limite") or 500), 1), LIMITE_API)
+    except ValueError:
+        return {"erreur": "paramètre invalide"}, 400
+
+    formations = [normaliser_nom_formation(f) for f in args.getlist("formation") if f.strip()] or None
+    salle = (args.get("salle") or "").strip() or None
+
+    cours = stock_courant().periode(du, au, formations)
+    if salle:
+        cours = (c for c in cours if c.get("salle") == salle)
+
+    page = list(islice(cours, debut, debut + limite + 1))
+    suivant = debut + limite if len(page) > limite else None
+
+    return {
+        "annee": get_annee_active(),
+        "du": du,
+        "au": au,
+        "colonnes": COLONNES_API,
+        "cours": [[c.get(k) for k in COLONNES_API] for c in page[:limite]],
+        "debut": debut,
+        "suivant": suivant
+    }
+
+
+@app.route("/api/calendrier")
+def api_calendrier():
+    """
+    Résumé des jours d'un mois pour le calendrier de /preview : ?mois=2026-02
+    (ou du/au, semaine). "matin" / "apres_midi" : formations à loger, à
+    comparer au nombre de salles.
+    """
+    if not session.get("admin"):
+        return redirect("/login")
+
+    args = request.args
+    if not any(args.get(k) for k in ("mois", "semaine", "du", "au")):
+        args = {"mois": date.today().strftime("%Y-%m")}
+    try:
+        du, au = periode_demandee(args)
+    except ValueError:
+        return {"erreur": "période invalide"}, 400
+
+    return {
+        "du": du,
+        "au": au,
+        "salles": len(charger_salles()),
+        "jours": stock_courant().resumes(du, au)
+    }
+
+
+# ======================
+# SALLES LIBRES
+# ======================
+
+RECHERCHE_MAX_JOURS = 366
+
+@app.route("/api/salles_libres")
+def api_salles_libres():
+    """
+    ?date=2026-02-05&debut=14h00&fin=16h00&capacite=30&accessible=1
+    ou, pour chercher le premier créneau libre sur une période :
+    ?du=2026-02-02&au=2026-04-10&duree=120&capacite=30
+    (debut peut être ajouté pour fixer l'horaire ; au vaut au plus du + 366 jours)
+    """
+    if not session.get("admin"):
+        return redirect("/login")
+
+    args = request.args
+    try:
+        capacite = int(args.get("capacite") or 0)
+        debut = to_minutes(args["debut"]) if args.get("debut") else None
+        fin = to_minutes(args["fin"]) if args.get("fin") else None
+        duree = int(args["duree"]) if args.get("duree") else None
+    except ValueError:
+        return {"erreur": "paramètre invalide"}, 400
+    accessible = args.get("accessible", "").lower() in ("1", "oui", "true", "on")
+
+    def salles_json(salles):
+        return [{"code": s["code"], "capacite": s["capacite"], "accessible": s["accessible"]} for s in salles]
+
+    index = index_occupation()
+
+    if args.get("date"):
+        try:
+            jour = datetime.strptime(args["date"], "%Y-%m-%d").date().isoformat()
+        except ValueError:
+            return {"erreur": "date invalide"}, 400
+        if debut is None or fin is None or fin <= debut:
+            return {"erreur": "debut et fin requis"}, 400
+
+        return {
+            "date": jour,
+            "debut": en_heure(debut),
+            "fin": en_heure(fin),
+            "salles": salles_json(index.salles_libres(jour, debut, fin, capacite, accessible))
+        }
+
+    try:
+        du = datetime.strptime(args.get("du") or date.today().isoformat(), "%Y-%m-%d").date()
+        au = datetime.strptime(args["au"], "%Y-%m-%d").date() if args.get("au") else None
+        # recherche bornée à un an après du (au=9999-12-31 ne parcourt pas huit millénaires)
+        au = min(au or date.max, du + timedelta(days=RECHERCHE_MAX_JOURS))
+    except (ValueError, OverflowError):
+        return {"erreur": "période invalide"}, 400
+
+    if duree is None:
+        if debut is None or fin is None or fin <= debut:
+            return {"erreur": "duree ou debut/fin requis"}, 400
+        duree = fin - debut
+    if duree <= 0:
+        return {"erreur": "durée invalide"}, 400
+
+    trouve = index.premier_creneau_libre(du, au, duree, capacite, accessible, debut=debut)
+    if trouve is None:
+        return {"date": None, "salles": []}
+
+    jour, h_debut, h_fin, salles = trouve
+    return {
+        "date": jour,
+        "debut": en_heure(h_debut),
+        "fin": en_heure(h_fin),
+        "salles": salles_json(salles)
+    }
+
+# ======================
+# ANALYTIQUE
+# ======================
+
+_analytique = {"cle": None, "rapport": None}
+
+def rapport_analytique():
+    """Rapport d'utilisation des salles, recalculé seulement si les données ont changé."""
+    base = annee_path()
+    effectifs_path = os.path.join(base, "effectifs.json")
+    salles_path = os.path.join(REFERENCES, "salles.csv")
+    cle = (base, version(base), signature_fichier(salles_path))
+
+    if _analytique["cle"] != cle:
+        _analytique["rapport"] = analytique.calculer(
+            stock_courant().cours(),
+            charger_salles(),
+            safe_json(effectifs_path, {})
+        )
+        _analytique["cle"] = cle
+
+    return _analytique["rapport"]
+
+@app.route("/analytique")
+def analytique_page():
+    if not session.get("admin"):
+        return redirect("/login")
+
+    return render_template("analytique.html", annee=get_annee_active(), rapport=rapport_analytique())
+
+@app.route("/analytique.csv")
+def analytique_csv():
+    if not session.get("admin"):
+        return redirect("/login")
+
+    rapport = rapport_analytique()
+    out = io.StringIO()
+    if rapport:
+        csv.writer(out, delimiter=";").writerows(analytique.lignes_csv(rapport))
+
+    return Response(
+        out.getvalue(),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename=utilisation_salles_{get_annee_active()}.csv"}
+    )
+
+# ======================
+# SIMULATION
+# ======================
+
+@app.route("/simulation", methods=["POST"])
+def simulation_route():
+    """
+    Corps JSON : {"effectifs": {...}, "accessibilite": {...}, "salles": [...]}
+    ou formulaire multipart avec un fichier "salles_csv".
+    Rien n'est enregistré.
+    """
+    if not session.get("admin"):
+        return redirect("/login")
+
+    donnees = request.get_json(silent=True)
+    if donnees is None:  # formulaire multipart (salles_csv) ou corps vide
+        donnees = {}
+    base = annee_path()
+    invalide = ({"erreur": "données de simulation invalides"}, 400)
+
+    if not isinstance(donnees, dict):
+        return invalide
+    for cle in ("effectifs", "accessibilite"):
+        if not isinstance(donnees.get(cle) or {}, dict):
+            return invalide
+    salles_donnees = donnees.get("salles")
+    if salles_donnees is not None and not (
+        isinstance(salles_donnees, list) and all(isinstance(s, dict) for s in salles_donnees)
+    ):
+        return invalide
+
+    try:
+        effectifs_hyp = {f: int(v) for f, v in (donnees.get("effectifs") or {}).items()}
+        access_hyp = {f: bool(v) for f, v in (donnees.get("accessibilite") or {}).items()}
+
+        salles_hyp = None
+        fichier = request.files.get("salles_csv")
+        if fichier:
+            salles_hyp = lire_salles(io.StringIO(fichier.read().decode("utf-8-sig")))
+        elif donnees.get("salles") is not None:
+            salles_hyp = lire_salles(io.StringIO(
+                "code;capacite;accessible\n" + "\n".join(
+                    f"{s['code']};{s['capacite']};{'OUI' if s.get('accessible', 'OUI') in (True, 'OUI', 'oui') else 'NON'}"
+                    for s in donnees["salles"]
+                )
+            ))
+    except (ValueError, KeyError, TypeError, AttributeError, UnicodeDecodeError):
+        return invalide
+
+    return simulation.simuler(
+        stock_courant().cours(),
+        allouer_en_parallele,
+        charger_salles(),
+        safe_json(os.path.join(base, "effectifs.json"), {}),
+        safe_json(os.path.join(base, "accessibilite.json"), {}),
+        effectifs_hyp=effectifs_hyp,
+        access_hyp=access_hyp,
+        salles_hyp=salles_hyp
+    )
+
+# ======================
+# ARCHIVES
+# ======================
+
+@app.cli.command("archiver")
+@click.argument("annee")
+@click.option("--garder", is_flag=True, help="Conserver le dossier de l'année après archivage.")
+def archiver_commande(annee, garder):
+    """Fige une année terminée dans data/output/archives/<annee>.sqlite."""
+    if annee == get_annee_active():
+        raise click.ClickException("Impossible d'archiver l'année active.")
+    dossier = os.path.join(OUTPUT, annee)
+    if not os.path.isdir(dossier):
+        raise click.ClickException(f"Année introuvable : {annee}")
+
+    resultat = archives.archiver(dossier, ARCHIVES, supprimer=not garder)
+    click.echo(f"{resultat['annee']} : {resultat['cours']} cours archivés ({resultat['taille'] // 1024} Ko) -> {resultat['fichier']}")
+
+def ouvrir_archive(annee):
+    if annee not in archives.annees_archivees(ARCHIVES):
+        return None
+    return archives.Archive(archives.chemin_archive(ARCHIVES, annee))
+
+@app.route("/archives")
+def archives_liste():
+    if not session.get("admin"):
+        return redirect("/login")
+    return {"annees": archives.annees_archivees(ARCHIVES)}
+
+@app.route("/archives/<annee>")
+def archives_annee(annee):
+    if not session.get("admin"):
+        return redirect("/login")
+
+    archive = ouvrir_archive(annee)
+    if archive is None:
+        return {"erreur": "année non archivée"}, 404
+    return {"annee": annee, "dates": archive.dates(), "formations": archive.formations()}
+
+@app.route("/archives/<annee>/cours")
+def archives_cours(annee):
+    """?date=AAAA-MM-JJ et/ou ?formation=NOM (au moins un des deux)."""
+    if not session.get("admin"):
+        return redirect("/login")
+
+    archive = ouvrir_archive(annee)
+    if archive is None:
+        return {"erreur": "année non archivée"}, 404
+
+    jour = request.args.get("date")
+    formation = request.args.get("formation")
+    if not jour and not formation:
+        return {"erreur": "date ou formation requise"}, 400
+
+    return {"annee": annee, "cours": archive.cours(date=jour, formation=formation)}
+
+# ======================
+# EXPORTS ICS / CSV
+# ======================
+
+def cours_a_exporter(stock, formation=None, du=None, au=None):
+    return stock.periode(du, au, [formation] if formation else None)
+
+@app.route("/export/<format>")
+def export(format):
+    """
+    Public, comme /tv (abonnement depuis un agenda) :
+    /export/ics?formation=SIO 1   /export/csv?salle=B1&du=2026-01-05&au=2026-01-31
+    /export/ics?enseignant=RAMON
+    """
+    if format not in ("ics", "csv"):
+        return "Format inconnu", 404
+
+    filtres = {k: (request.args.get(k) or "").strip() or None for k in ("formation", "salle", "enseignant", "du", "au")}
+    if filtres["formation"]:
+        filtres["formation"] = normaliser_nom_formation(filtres["formation"])
+    for k in ("du", "au"):
+        if filtres[k]:
+            try:
+                datetime.strptime(filtres[k], "%Y-%m-%d")
+            except ValueError:
+                return "Date invalide", 400
+
+    base = annee_path()
+    annee = get_annee_active()
+    stock = stock_courant()
+    manifeste = stock.manifeste()  # migration éventuelle avant de lire la version
+    v = version(base)
+    cle = hashlib.sha1(json.dumps([annee, format, filtres], sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    etag = f"{cle}-{v}"
+
+    nom = " ".join(x for x in (filtres["formation"], filtres["salle"], filtres["enseignant"]) if x) or annee
+    mimetype = "text/calendar" if format == "ics" else "text/csv"
+    entetes = {
+        "ETag": f'"{etag}"',
+        "Cache-Control": "no-cache",
+        "Content-Disposition": f"inline; filename=planning_{annee}.{format}"
+    }
+
+    if etag in request.if_none_match:
+        return Response(status=304, headers=entetes)
+
+    # mise en cache seulement pour une formation ou une salle connue : un
+    # filtre libre (enseignant, nom inventé) ne crée pas de fichier
+    en_cache = (
+        not filtres["enseignant"]
+        and (not filtres["formation"] or filtres["formation"] in manifeste)
+        and (not filtres["salle"] or filtres["salle"] in {s["code"] for s in charger_salles()})
+    )
+    path = exports.chemin_cache(os.path.join(base, "exports"), cle, v, format)
+    if en_cache and os.path.exists(path):
+        reponse = send_file(path, mimetype=mimetype, etag=False, conditional=False)
+        reponse.headers.update(entetes)
+        return reponse
+
+    cours = exports.filtrer(
+        cours_a_exporter(stock, filtres["formation"], filtres["du"], filtres["au"]),
+        formation=filtres["formation"],
+        salle=filtres["salle"],
+        prof=filtres["enseignant"],
+        du=filtres["du"],
+        au=filtres["au"]
+    )
+    lignes = exports.lignes_ics(cours, f"Planning {nom}") if format == "ics" else exports.lignes_csv(cours)
+
+    if en_cache:
+        lignes = exports.avec_cache(lignes, path)
+    return Response(lignes, mimetype=mimetype, headers=entetes)
+
 # ======================
 # GESTION DES FORMATIONS
 # ======================
@@ -726,7 +1438,6 @@ def formations_add():
     if not session.get("admin"):
         return redirect("/login")
 
-    base = annee_path()
     nom = request.form.get("nom", "").strip()
     effectif_str = request.form.get("effectif", "0")
     
@@ -738,28 +1449,12 @@ def formations_add():
     except ValueError:
         effectif = 0
     
-    # Charger les formations
-    formations = charger_formations()
-    
-    # Vérifier si elle existe déjà
-    if not any(f["nom"].upper() == nom.upper() for f in formations):
-        formations.append({"nom": nom, "effectif": effectif})
-        sauver_formations(formations)
+    # Ajouter si elle n'existe pas déjà
+    if ajouter_formation(nom, effectif):
         
         # Initialiser les données pour cette formation
-        effectifs_path = os.path.join(base, "effectifs.json")
-        access_path = os.path.join(base, "accessibilite.json")
-        
-        effectifs = safe_json(effectifs_path, {})
-        access = safe_json(access_path, {})
-        
-        effectifs[nom] = effectif
-        access[nom] = False
-        
-        with open(effectifs_path, "w", encoding="utf-8") as f:
-            json.dump(effectifs, f, indent=2)
-        with open(access_path, "w", encoding="utf-8") as f:
-            json.dump(access, f, indent=2)
+        modifier_annee("effectifs.json", lambda effectifs: effectifs.update({nom: effectif}), {})
+        modifier_annee("accessibilite.json", lambda access: access.update({nom: False}), {})
     
     return redirect("/")
 
@@ -768,37 +1463,46 @@ def formations_delete():
     if not session.get("admin"):
         return redirect("/login")
 
-    base = annee_path()
     nom = request.form.get("nom", "").strip()
     
     if not nom:
         return redirect("/")
     
-    # Charger les formations
-    formations = charger_formations()
-    
     # Supprimer la formation
-    formations = [f for f in formations if f["nom"].upper() != nom.upper()]
-    sauver_formations(formations)
-    
-    # Supprimer des effectifs et accessibilité
-    effectifs_path = os.path.join(base, "effectifs.json")
-    access_path = os.path.join(base, "accessibilite.json")
-    
-    effectifs = safe_json(effectifs_path, {})
-    access = safe_json(access_path, {})
-    
-    # Supprimer toutes les variantes du nom
-    effectifs = {k: v for k, v in effectifs.items() if k.upper() != nom.upper()}
-    access = {k: v for k, v in access.items() if k.upper() != nom.upper()}
-    
-    with open(effectifs_path, "w", encoding="utf-8") as f:
-        json.dump(effectifs, f, indent=2)
-    with open(access_path, "w", encoding="utf-8") as f:
-        json.dump(access, f, indent=2)
+    retirer_formation(nom)
     
+    # Supprimer des effectifs et accessibilité (toutes les variantes du nom)
+    def retirer(donnees):
+        for k in [k for k in donnees if k.upper() == nom.upper()]:
+            del donnees[k]
+
+    modifier_annee("effectifs.json", retirer, {})
+    modifier_annee("accessibilite.json", retirer, {})
+
+    # Supprimer ses cours (seule sa partition est touchée)
+    stock = stock_courant()
+    for formation in stock.manifeste():
+        if normaliser_nom_formation(formation) == normaliser_nom_formation(nom):
+            stock.supprimer_formation(formation)
+
     return redirect("/")
 
+@app.route("/formations/recharger", methods=["POST"])
+def formations_recharger():
+    """Relit le CSV source d'une formation et remplace uniquement sa partition."""
+    if not session.get("admin"):
+        return redirect("/login")
+
+    nom = normaliser_nom_formation(request.form.get("nom", ""))
+    source = stock_courant().manifeste().get(nom, {}).get("source")
+    chemin = os.path.join(IMPORTS, source) if source else None
+
+    if not chemin or not os.path.exists(chemin):
+        return "Fichier source introuvable pour cette formation", 404
+
+    id_tache = taches.soumettre("import", tache_import, chemin, nom, forcer=True, cle=("import", chemin))
+    return redirect(f"/?tache={id_tache}")
+
 # ======================
 # EFFECTIFS
 # ======================
@@ -808,9 +1512,6 @@ def effectifs():
     if not session.get("admin"):
         return redirect("/login")
 
-    base = annee_path()
-    effectifs_path = os.path.join(base, "effectifs.json")
-    
     # Récupérer tous les effectifs du formulaire
     effectifs = {}
     for formation, effectif_str in request.form.items():
@@ -820,10 +1521,10 @@ def effectifs():
         except ValueError:
             effectifs[formation] = 0
     
-    # Sauvegarder
-    with open(effectifs_path, "w", encoding="utf-8") as f:
-        json.dump(effectifs, f, indent=2)
-    
+    # Sauvegarder (fusion : les formations absentes du formulaire sont conservées)
+    modifier_annee("effectifs.json", lambda courant: courant.update(effectifs), {})
+
+    soumettre_revalidation()
     return redirect("/")
 
 # ======================
@@ -835,9 +1536,6 @@ def accessibilite():
     if not session.get("admin"):
         return redirect("/login")
 
-    base = annee_path()
-    access_path = os.path.join(base, "accessibilite.json")
-    
     # Récupérer les données du formulaire (seulement celles cochées)
     access = {}
     for formation in request.form.keys():
@@ -851,19 +1549,14 @@ def accessibilite():
             access[f["nom"]] = False
     
     # Sauvegarder
-    with open(access_path, "w", encoding="utf-8") as f:
-        json.dump(access, f, indent=2)
-    
-    return {"status": "ok"}
+    modifier_annee("accessibilite.json", lambda courant: courant.update(access), {})
+
+    return {"status": "ok", "tache": soumettre_revalidation()}
 
 @app.route("/admin/reset_imports", methods=["POST"])
 def reset_imports():
-    base = annee_path()
-
-    # 🔹 Vider cours_planifies.json
-    cours_path = os.path.join(base, "cours_planifies.json")
-    with open(cours_path, "w", encoding="utf-8") as f:
-        json.dump([], f, indent=2)
+    # 🔹 Vider toutes les partitions de cours
+    stock_courant().vider()
 
     # 🔹 Supprimer les CSV du dossier imports
     for fichier in os.listdir(IMPORTS):
@@ -911,9 +1604,70 @@ def logout():
 
 
 
+# ======================
+# DÉMARRAGE
+# ======================
+
+_demarrage = {"pret": False, "duree": None}
+_demarrage_lock = threading.Lock()
+
+def prechauffer():
+    """Références, gabarits et index des cours, chargés avant la première requête."""
+    charger_formations()
+    charger_salles()
+    charger_anniversaires()
+    for nom in app.jinja_env.list_templates():
+        app.jinja_env.get_template(nom)
+
+    stock = stock_courant()
+    stock.cours()
+    stock.resumes()
+    stock.etat_imports()
+    list(stock.periode("9999-12-31"))  # construit les index par formation sans rien renvoyer
+    index_occupation()
+
+def creer_app(prechauffer_caches=True):
+    """
+    Fabrique de l'application : crée les dossiers de données et prépare les
+    caches. Avec gunicorn --preload (gunicorn.conf.py), elle s'exécute une
+    seule fois dans le processus maître et les workers en héritent.
+    """
+    with _demarrage_lock:
+        if not _demarrage["pret"]:
+            debut = time.perf_counter()
+            for d in (IMPORTS, REFERENCES, OUTPUT):
+                os.makedirs(d, exist_ok=True)
+            if prechauffer_caches:
+                prechauffer()
+            _demarrage.update(pret=True, duree=round(time.perf_counter() - debut, 3))
+    return app
+
+def apres_fork():
+    """Dans chaque worker : les threads du maître n'existent pas après le fork."""
+    if os.environ.get("PLANNING_SURVEILLER_IMPORTS") == "1":
+        surveillant.demarrer()
+
+@app.before_request
+def assurer_demarrage():
+    # flask run / app:app sans fabrique : préparation à la première requête
+    # (pas pour la sonde /pret, qui doit répondre 503 tant que ce n'est pas fait)
+    if not _demarrage["pret"] and request.endpoint != "pret":
+        creer_app()
+
+@app.route("/pret")
+def pret():
+    """Sonde de disponibilité (répartiteur de charge, redémarrages)."""
+    pret = _demarrage["pret"] and os.access(annee_path(), os.W_OK)
+    return {
+        "pret": pret,
+        "pid": os.getpid(),
+        "prechauffage_s": _demarrage["duree"],
+        "annee": get_annee_active()
+    }, (200 if pret else 503)
+
 # ======================
 # RUN
 # ======================
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    creer_app().run(debug=True)
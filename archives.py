@@ -0,0 +1,157 @@
+"""
+Archives des années terminées.
+
+Une année archivée tient dans un seul fichier SQLite compact
+(data/output/archives/<annee>.sqlite) : les noms de formations et de
+matières sont mis en table, les cours indexés par date et par formation.
+La consultation est en lecture seule et ne charge que le jour ou la
+formation demandés.
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+from contextlib import closing
+
+from stockage import Stock
+
+SCHEMA = """
+CREATE TABLE formations (id INTEGER PRIMARY KEY, nom TEXT UNIQUE NOT NULL);
+CREATE TABLE matieres (id INTEGER PRIMARY KEY, nom TEXT UNIQUE NOT NULL);
+CREATE TABLE cours (
+    ordre INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    heure_debut TEXT NOT NULL,
+    heure_fin TEXT NOT NULL,
+    formation INTEGER NOT NULL REFERENCES formations(id),
+    matiere INTEGER NOT NULL REFERENCES matieres(id),
+    salle TEXT
+);
+CREATE INDEX cours_date ON cours(date);
+CREATE INDEX cours_formation ON cours(formation, date);
+CREATE TABLE donnees (nom TEXT PRIMARY KEY, contenu TEXT NOT NULL);
+"""
+
+DONNEES = ("effectifs.json", "accessibilite.json", "verrou.json")
+
+
+def chemin_archive(dossier_archives, annee):
+    return os.path.join(dossier_archives, f"{annee}.sqlite")
+
+
+def annees_archivees(dossier_archives):
+    if not os.path.isdir(dossier_archives):
+        return []
+    return sorted(f[:-len(".sqlite")] for f in os.listdir(dossier_archives) if f.endswith(".sqlite"))
+
+
+def archiver(dossier_annee, dossier_archives, supprimer=True):
+    """
+    Fige l'année contenue dans dossier_annee dans un fichier SQLite.
+    Le dossier d'origine est supprimé une fois l'archive écrite et vérifiée.
+    """
+    annee = os.path.basename(os.path.normpath(dossier_annee))
+    os.makedirs(dossier_archives, exist_ok=True)
+    destination = chemin_archive(dossier_archives, annee)
+    if os.path.exists(destination):
+        raise FileExistsError(destination)
+
+    cours = Stock(dossier_annee).cours()
+    tmp = destination + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.executescript(SCHEMA)
+        ids_formations, ids_matieres = {}, {}
+
+        def ident(table, ids, nom):
+            if nom not in ids:
+                ids[nom] = conn.execute(f"INSERT INTO {table} (nom) VALUES (?)", (nom,)).lastrowid
+            return ids[nom]
+
+        conn.executemany(
+            "INSERT INTO cours (date, heure_debut, heure_fin, formation, matiere, salle) VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    c["date"], c["heure_debut"], c["heure_fin"],
+                    ident("formations", ids_formations, c["formation"]),
+                    ident("matieres", ids_matieres, c["matiere_nom"]),
+                    c.get("salle")
+                )
+                for c in cours
+            )
+        )
+
+        for nom in DONNEES:
+            path = os.path.join(dossier_annee, nom)
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    contenu = json.dumps(json.load(f), separators=(",", ":"))
+                conn.execute("INSERT INTO donnees (nom, contenu) VALUES (?, ?)", (nom, contenu))
+
+        conn.commit()
+        conn.execute("VACUUM")
+        nb = conn.execute("SELECT COUNT(*) FROM cours").fetchone()[0]
+    finally:
+        conn.close()
+
+    if nb != len(cours):
+        os.remove(tmp)
+        raise RuntimeError(f"archive incomplète : {nb} cours sur {len(cours)}")
+
+    os.replace(tmp, destination)
+    if supprimer:
+        shutil.rmtree(dossier_annee)
+
+    return {"annee": annee, "cours": nb, "fichier": destination, "taille": os.path.getsize(destination)}
+
+
+class Archive:
+    """Lecture seule d'une année archivée."""
+
+    def __init__(self, path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        self.path = path
+
+    def _connexion(self):
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        return closing(conn)
+
+    def dates(self):
+        with self._connexion() as conn:
+            return [r[0] for r in conn.execute("SELECT DISTINCT date FROM cours ORDER BY date")]
+
+    def formations(self):
+        with self._connexion() as conn:
+            return [r[0] for r in conn.execute("SELECT nom FROM formations ORDER BY id")]
+
+    def cours(self, date=None, formation=None):
+        requete = """
+            SELECT c.date, c.heure_debut, c.heure_fin, f.nom AS formation, m.nom AS matiere_nom, c.salle
+            FROM cours c
+            JOIN formations f ON f.id = c.formation
+            JOIN matieres m ON m.id = c.matiere
+        """
+        conditions, params = [], []
+        if date:
+            conditions.append("c.date = ?")
+            params.append(date)
+        if formation:
+            conditions.append("f.nom = ?")
+            params.append(formation)
+        if conditions:
+            requete += " WHERE " + " AND ".join(conditions)
+        requete += " ORDER BY c.date, c.ordre"
+
+        with self._connexion() as conn:
+            return [dict(r) for r in conn.execute(requete, params)]
+
+    def donnees(self, nom, default=None):
+        with self._connexion() as conn:
+            r = conn.execute("SELECT contenu FROM donnees WHERE nom = ?", (nom,)).fetchone()
+        return json.loads(r[0]) if r else default
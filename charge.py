@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+"""
+Test de charge local : des écrans TV qui interrogent /tv pendant que des
+administrateurs modifient des salles dans /preview, changent des effectifs
+et importent des CSV.
+
+    python charge.py --gunicorn 4 --duree 60 --ecrans 80 --admins 4
+    python charge.py --url http://127.0.0.1:8000 --duree 30     (serveur déjà lancé)
+
+Avec --gunicorn N, l'application est copiée dans un dossier temporaire
+(données comprises) et servie par gunicorn à N workers : les écritures du
+test ne touchent pas les données réelles. Avec --url, le serveur visé est
+modifié : à réserver à une copie.
+
+Le rapport donne, par route : nombre de requêtes, débit, latences
+p50/p95/p99 et erreurs, puis les mises à jour perdues (salles saisies ou
+effectifs écrits qui ne se retrouvent pas à la fin du test). Pour les
+salles, l'historique des cours indique quelle écriture est passée en
+dernier : "attribution" (réattribution automatique, qui repart de zéro
+dès qu'un cours est sans salle), "import", "saisie" (écrasée par une
+autre saisie : ne devrait pas arriver) ou "absente" (l'écriture n'a
+laissé aucune trace : perte réelle).
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import quote, urlencode, urlsplit
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# ======================
+# CLIENT HTTP
+# ======================
+
+class Client:
+    """Une connexion keep-alive par thread, cookie de session conservé."""
+
+    def __init__(self, url, mesures):
+        u = urlsplit(url)
+        self.hote, self.port = u.hostname, u.port or 80
+        self.mesures = mesures
+        self.cookie = None
+        self.conn = None
+
+    def requete(self, methode, chemin, route, corps=None, entetes=None):
+        entetes = dict(entetes or {})
+        if self.cookie:
+            entetes["Cookie"] = self.cookie
+
+        debut = time.perf_counter()
+        try:
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.hote, self.port, timeout=30)
+            self.conn.request(methode, chemin, body=corps, headers=entetes)
+            r = self.conn.getresponse()
+            donnees = r.read()
+        except (OSError, http.client.HTTPException) as e:
+            self.conn = None
+            self.mesures.ajouter(route, time.perf_counter() - debut, erreur=type(e).__name__)
+            return None, None, b""
+
+        if r.getheader("Set-Cookie"):
+            self.cookie = r.getheader("Set-Cookie").split(";")[0]
+        if r.getheader("Connection", "").lower() == "close":
+            self.conn.close()
+            self.conn = None
+
+        erreur = None
+        if r.status >= 400:
+            erreur = str(r.status)
+        elif r.status in (301, 302, 303) and (r.getheader("Location") or "").endswith("/login") and route != "login":
+            erreur = "session"
+        self.mesures.ajouter(route, time.perf_counter() - debut, erreur=erreur)
+        return r.status, r, donnees
+
+    def connexion(self, mot_de_passe):
+        corps = urlencode({"password": mot_de_passe})
+        statut, _, _ = self.requete(
+            "POST", "/login", "login", corps, {"Content-Type": "application/x-www-form-urlencoded"}
+        )
+        return statut == 302 and self.cookie is not None
+
+
+def multipart(champ, nom_fichier, contenu):
+    frontiere = uuid.uuid4().hex
+    corps = (
+        f"--{frontiere}\r\n"
+        f'Content-Disposition: form-data; name="{champ}"; filename="{nom_fichier}"\r\n'
+        "Content-Type: text/csv\r\n\r\n"
+    ).encode("utf-8") + contenu + f"\r\n--{frontiere}--\r\n".encode("utf-8")
+    return corps, {"Content-Type": f"multipart/form-data; boundary={frontiere}"}
+
+
+# ======================
+# MESURES
+# ======================
+
+class Mesures:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durees = {}
+        self.erreurs = {}
+
+    def ajouter(self, route, duree, erreur=None):
+        with self._lock:
+            self.durees.setdefault(route, []).append(duree)
+            if erreur:
+                par_type = self.erreurs.setdefault(route, {})
+                par_type[erreur] = par_type.get(erreur, 0) + 1
+
+    def rapport(self, duree_totale):
+        lignes = {}
+        for route, durees in sorted(self.durees.items()):
+            durees = sorted(durees)
+            lignes[route] = {
+                "requetes": len(durees),
+                "debit": round(len(durees) / duree_totale, 1),
+                "p50_ms": round(centile(durees, 50) * 1000, 1),
+                "p95_ms": round(centile(durees, 95) * 1000, 1),
+                "p99_ms": round(centile(durees, 99) * 1000, 1),
+                "erreurs": self.erreurs.get(route, {})
+            }
+        return lignes
+
+
+def centile(valeurs_triees, p):
+    if not valeurs_triees:
+        return 0.0
+    i = min(len(valeurs_triees) - 1, max(0, round(p / 100 * len(valeurs_triees)) - 1))
+    return valeurs_triees[i]
+
+
+# ======================
+# SCÉNARIOS
+# ======================
+
+def ecran(client, arret, intervalle):
+    # les écrans ne démarrent pas tous à la même seconde
+    time.sleep(random.uniform(0, intervalle))
+    while not arret.is_set():
+        client.requete("GET", "/tv", "tv")
+        arret.wait(intervalle)
+
+
+class Administrateur:
+    """
+    Chaque administrateur a ses propres couples (date, formation) et sa
+    propre clé d'effectifs : la dernière valeur qu'il a écrite doit être
+    celle que le serveur renvoie à la fin (sinon : mise à jour perdue).
+    """
+
+    def __init__(self, n, client, couples, csv_import, poids, pause):
+        self.n = n
+        self.client = client
+        self.couples = couples
+        self.csv_import = csv_import
+        self.poids = poids
+        self.pause = pause
+        self.salles = {}       # {(date, formation): dernière salle saisie}
+        self.effectif = None   # dernier effectif écrit sous la clé CHARGE <n>
+        self.compteur = 0
+
+    def salle(self):
+        if not self.couples:
+            return
+        jour, formation = random.choice(self.couples)
+        self.compteur += 1
+        salle = f"T{self.n}-{self.compteur}"
+        corps = urlencode({f"{jour}|{formation}": salle})
+        statut, _, _ = self.client.requete(
+            "POST", f"/preview?date={jour}", "preview_post", corps,
+            {"Content-Type": "application/x-www-form-urlencoded"}
+        )
+        if statut == 302:
+            self.salles[(jour, formation)] = salle
+
+    def effectifs(self):
+        self.compteur += 1
+        corps = urlencode({f"CHARGE {self.n}": self.compteur})
+        statut, _, _ = self.client.requete(
+            "POST", "/effectifs", "effectifs", corps, {"Content-Type": "application/x-www-form-urlencoded"}
+        )
+        if statut == 302:
+            self.effectif = self.compteur
+
+    def importer(self):
+        if not self.csv_import:
+            return
+        nom, contenu = self.csv_import
+        # contenu légèrement différent à chaque fois : l'import n'est pas court-circuité par le hash
+        self.compteur += 1
+        corps, entetes = multipart("csv_file", nom, contenu + b"\n" * (self.compteur % 2))
+        self.client.requete("POST", "/", "import", corps, entetes)
+
+    def lire(self):
+        self.client.requete("GET", "/", "index")
+
+    def boucle(self, arret):
+        actions = [self.salle, self.effectifs, self.importer, self.lire]
+        while not arret.is_set():
+            random.choices(actions, weights=self.poids)[0]()
+            arret.wait(self.pause)
+
+
+def couples_editables(client, exclus):
+    """(date, formation) qui ont cours, pris dans l'API, hors formation importée pendant le test."""
+    statut, _, donnees = client.requete("GET", "/api/cours?limite=5000", "api_cours")
+    if statut != 200:
+        return []
+    colonnes = json.loads(donnees)["colonnes"]
+    couples = set()
+    for ligne in json.loads(donnees)["cours"]:
+        c = dict(zip(colonnes, ligne))
+        if c["formation"] not in exclus:
+            couples.add((c["date"], c["formation"]))
+    return sorted(couples)
+
+
+def version_historique(client):
+    statut, _, donnees = client.requete("GET", "/historique/diff", "historique")
+    return json.loads(donnees)["a"] if statut == 200 else None
+
+
+def dernieres_ecritures(client, depuis):
+    """{(date, formation): motif de la dernière version qui a changé sa salle}"""
+    if depuis is None:
+        return {}
+    statut, _, donnees = client.requete("GET", f"/historique/diff?de={depuis}&a=1000000000", "historique")
+    if statut != 200:
+        return {}
+    derniere = {}
+    for v in json.loads(donnees)["versions"]:
+        for formation, changements in v["formations"].items():
+            for s in changements["salles"]:
+                derniere[(s["date"], formation)] = v["motif"]
+    return derniere
+
+
+def verifier(client, admins, dossier_donnees, version_depart):
+    """Compte les mises à jour perdues une fois le trafic arrêté."""
+    perdues = {"salles": 0, "salles_par_cause": {}, "effectifs": 0}
+
+    attendu = {}
+    for a in admins:
+        attendu.update(a.salles)
+    derniere = None
+    for (jour, formation), salle in attendu.items():
+        chemin = f"/api/cours?du={jour}&au={jour}&formation={quote(formation)}"
+        statut, _, donnees = client.requete("GET", chemin, "verification")
+        if statut == 200:
+            d = json.loads(donnees)
+            i = d["colonnes"].index("salle")
+            if all(ligne[i] == salle for ligne in d["cours"]):
+                continue
+        if derniere is None:
+            derniere = dernieres_ecritures(client, version_depart)
+        cause = derniere.get((jour, formation), "absente").split(" ")[0]
+        perdues["salles"] += 1
+        perdues["salles_par_cause"][cause] = perdues["salles_par_cause"].get(cause, 0) + 1
+
+    if dossier_donnees:
+        annee = json.load(open(os.path.join(dossier_donnees, "output", "annee_active.json"), encoding="utf-8"))["annee"]
+        with open(os.path.join(dossier_donnees, "output", annee, "effectifs.json"), encoding="utf-8") as f:
+            effectifs = json.load(f)
+        for a in admins:
+            if a.effectif is not None and effectifs.get(f"CHARGE {a.n}") != a.effectif:
+                perdues["effectifs"] += 1
+    else:
+        perdues["effectifs"] = None  # non vérifiable sans accès aux fichiers du serveur
+
+    return perdues
+
+
+# ======================
+# SERVEUR
+# ======================
+
+def lancer_gunicorn(workers, port):
+    copie = tempfile.mkdtemp(prefix="charge-")
+    racine = os.path.join(copie, "app")
+    shutil.copytree(
+        BASE_DIR, racine,
+        ignore=shutil.ignore_patterns(".git", "__pycache__", "venv", "*.pyc", ".ecriture.lock")
+    )
+    processus = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-w", str(workers),
+         "-b", f"127.0.0.1:{port}", "--log-level", "warning"],
+        cwd=racine
+    )
+
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/login")
+            conn.getresponse().read()
+            return processus, url, copie, os.path.join(racine, "data")
+        except OSError:
+            if processus.poll() is not None:
+                break
+            time.sleep(0.2)
+    processus.terminate()
+    shutil.rmtree(copie, ignore_errors=True)
+    raise SystemExit("gunicorn n'a pas démarré")
+
+
+# ======================
+# PROGRAMME
+# ======================
+
+def afficher(rapport, perdues, duree):
+    print(f"\nDurée : {duree:.1f} s")
+    print(f"{'route':<14}{'requêtes':>10}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}  erreurs")
+    for route, r in rapport.items():
+        erreurs = ", ".join(f"{k}×{v}" for k, v in r["erreurs"].items()) or "-"
+        print(
+            f"{route:<14}{r['requetes']:>10}{r['debit']:>9}{r['p50_ms']:>9}"
+            f"{r['p95_ms']:>9}{r['p99_ms']:>9}  {erreurs}"
+        )
+    causes = ", ".join(f"{k} {v}" for k, v in perdues["salles_par_cause"].items())
+    print(f"\nMises à jour perdues : salles {perdues['salles']}{f' ({causes})' if causes else ''}, "
+          f"effectifs {perdues['effectifs'] if perdues['effectifs'] is not None else 'non vérifié'}")
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--url", help="serveur déjà lancé (sinon --gunicorn)")
+    p.add_argument("--gunicorn", type=int, metavar="WORKERS", help="lancer gunicorn sur une copie de l'application")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--duree", type=float, default=30, help="secondes de trafic")
+    p.add_argument("--ecrans", type=int, default=50, help="nombre d'écrans TV")
+    p.add_argument("--intervalle-tv", type=float, default=1.0, help="secondes entre deux rafraîchissements d'un écran")
+    p.add_argument("--admins", type=int, default=3)
+    p.add_argument("--pause", type=float, default=0.2, help="secondes entre deux actions d'un administrateur")
+    p.add_argument("--mix", default="6,2,1,1",
+                   help="poids salles,effectifs,imports,lectures du tableau de bord (défaut 6,2,1,1)")
+    p.add_argument("--csv", help="CSV importé pendant le test (défaut : le premier de data/imports)")
+    p.add_argument("--mot-de-passe", default=os.environ.get("ADMIN_PASSWORD", "admin123"))
+    p.add_argument("--json", metavar="FICHIER", help="écrire aussi le rapport en JSON")
+    p.add_argument("--graine", type=int, help="graine aléatoire (tirages reproductibles)")
+    args = p.parse_args()
+
+    if not args.url and not args.gunicorn:
+        p.error("--url ou --gunicorn requis")
+    if args.graine is not None:
+        random.seed(args.graine)
+    poids = [float(x) for x in args.mix.split(",")]
+    if len(poids) != 4:
+        p.error("--mix attend 4 poids")
+
+    processus = copie = dossier_donnees = None
+    url = args.url
+    if args.gunicorn:
+        processus, url, copie, dossier_donnees = lancer_gunicorn(args.gunicorn, args.port)
+
+    try:
+        mesures = Mesures()
+
+        csv_import = None
+        chemin_csv = args.csv
+        if not chemin_csv:
+            imports = os.path.join(BASE_DIR, "data", "imports")
+            fichiers = sorted(f for f in os.listdir(imports) if f.lower().endswith(".csv")) if os.path.isdir(imports) else []
+            chemin_csv = os.path.join(imports, fichiers[0]) if fichiers else None
+        if chemin_csv:
+            with open(chemin_csv, "rb") as f:
+                csv_import = (os.path.basename(chemin_csv), f.read())
+
+        preparation = Client(url, Mesures())
+        if not preparation.connexion(args.mot_de_passe):
+            raise SystemExit("connexion admin refusée")
+        # formation du CSV importé : ses salles sont remises à zéro à chaque import
+        exclus = set()
+        if csv_import:
+            nom = os.path.splitext(csv_import[0])[0].upper()
+            exclus = {f for _, f in couples_editables(preparation, set()) if f.upper() in nom}
+        couples = couples_editables(preparation, exclus)
+        version_depart = version_historique(preparation)
+
+        admins = []
+        for n in range(args.admins):
+            client = Client(url, mesures)
+            if not client.connexion(args.mot_de_passe):
+                raise SystemExit("connexion admin refusée")
+            admins.append(Administrateur(n, client, couples[n::args.admins], csv_import, poids, args.pause))
+
+        arret = threading.Event()
+        threads = [
+            threading.Thread(target=ecran, args=(Client(url, mesures), arret, args.intervalle_tv), daemon=True)
+            for _ in range(args.ecrans)
+        ] + [
+            threading.Thread(target=a.boucle, args=(arret,), daemon=True)
+            for a in admins
+        ]
+
+        debut = time.perf_counter()
+        for t in threads:
+            t.start()
+        time.sleep(args.duree)
+        arret.set()
+        for t in threads:
+            t.join()
+        duree = time.perf_counter() - debut
+
+        # laisser les tâches de fond (imports, attribution) se terminer avant de vérifier
+        time.sleep(2)
+        perdues = verifier(preparation, admins, dossier_donnees, version_depart)
+        rapport = mesures.rapport(duree)
+        afficher(rapport, perdues, duree)
+
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({
+                    "parametres": vars(args),
+                    "duree": duree,
+                    "routes": rapport,
+                    "perdues": perdues
+                }, f, indent=2, ensure_ascii=False)
+    finally:
+        if processus:
+            processus.terminate()
+            processus.wait()
+        if copie:
+            shutil.rmtree(copie, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
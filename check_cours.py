@@ -1,8 +1,7 @@
-import json
+from stockage import stock
 
 # Charger les cours
-with open('data/output/2025-2026/cours_planifies.json', 'r', encoding='utf-8') as f:
-    cours = json.load(f)
+cours = stock('data/output/2025-2026').cours()
 
 # Chercher pour 2026-02-05 le matin
 jour = "2026-02-05"
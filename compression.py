@@ -0,0 +1,126 @@
+"""
+Compression des réponses et en-têtes de cache.
+
+- HTML / JSON / CSS / JS au-delà de SEUIL octets : brotli si le module est
+  installé et accepté par le client, sinon gzip.
+- Pages et API : ETag sur le contenu (un écran TV qui recharge une page
+  inchangée reçoit un 304 vide), Cache-Control no-cache (private pour
+  l'administration) et Vary.
+- Fichiers statiques : url_for('static', ...) ajoute ?v=<empreinte du
+  fichier> ; ces URL sont servies avec un cache d'un an (immutable), le
+  changement du fichier changeant l'URL.
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+
+from flask import request, session
+
+try:
+    import brotli
+except ImportError:  # gzip seul
+    brotli = None
+
+SEUIL = 1024
+TYPES_COMPRESSES = {
+    "text/html", "text/css", "text/plain", "text/javascript",
+    "application/json", "application/javascript", "image/svg+xml",
+}
+UN_AN = 365 * 24 * 3600
+
+_empreintes = {}  # {chemin: (signature, empreinte)}
+_empreintes_lock = threading.Lock()
+
+
+def empreinte_fichier(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    signature = (st.st_mtime_ns, st.st_size)
+    with _empreintes_lock:
+        deja = _empreintes.get(path)
+        if deja and deja[0] == signature:
+            return deja[1]
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for bloc in iter(lambda: f.read(1 << 16), b""):
+            h.update(bloc)
+    empreinte = h.hexdigest()[:12]
+    with _empreintes_lock:
+        _empreintes[path] = (signature, empreinte)
+    return empreinte
+
+
+def encodage_accepte(data):
+    if len(data) < SEUIL:
+        return None
+    if brotli is not None and request.accept_encodings["br"]:
+        return "br"
+    if request.accept_encodings["gzip"]:
+        return "gzip"
+    return None
+
+
+def compresser(data, encodage):
+    if encodage == "br":
+        return brotli.compress(data, quality=5)
+    # mtime=0 : même contenu, mêmes octets
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def ajouter_vary(response, *entetes):
+    for e in entetes:
+        if e not in response.vary:
+            response.vary.add(e)
+
+
+def installer(app):
+
+    @app.url_defaults
+    def versionner_statique(endpoint, values):
+        if endpoint == "static" and "filename" in values and "v" not in values:
+            v = empreinte_fichier(os.path.join(app.static_folder, values["filename"]))
+            if v:
+                values["v"] = v
+
+    @app.after_request
+    def compresser_et_cacher(response):
+        if request.endpoint == "static":
+            if request.args.get("v") and response.status_code in (200, 304):
+                response.cache_control.public = True
+                response.cache_control.max_age = UN_AN
+                response.cache_control.immutable = True
+                response.cache_control.no_cache = None
+            return response
+
+        if response.mimetype not in TYPES_COMPRESSES or response.status_code != 200:
+            return response
+        if response.is_streamed or response.direct_passthrough or "Content-Encoding" in response.headers:
+            return response
+
+        if "Cache-Control" not in response.headers:
+            response.cache_control.no_cache = True
+            if session.get("admin"):
+                response.cache_control.private = True
+        ajouter_vary(response, "Accept-Encoding", "Cookie")
+
+        data = response.get_data()
+        encodage = encodage_accepte(data)
+
+        if request.method in ("GET", "HEAD") and "ETag" not in response.headers:
+            etag = hashlib.sha1(data).hexdigest()[:20] + (f"-{encodage}" if encodage else "")
+            response.set_etag(etag)
+            if etag in request.if_none_match:
+                response.status_code = 304
+                response.set_data(b"")
+                for e in ("Content-Length", "Content-Type"):
+                    response.headers.pop(e, None)
+                return response
+
+        if encodage:
+            response.set_data(compresser(data, encodage))
+            response.headers["Content-Encoding"] = encodage
+        return response
@@ -0,0 +1,206 @@
+"""
+Coordination des écritures entre threads et workers gunicorn.
+
+- Les fichiers JSON sont écrits dans un fichier temporaire puis renommés
+  (os.replace) : un lecteur voit toujours l'ancienne ou la nouvelle version
+  complète, sans avoir à prendre de verrou.
+- Les écrivains d'un même dossier sont sérialisés par un verrou fcntl
+  (entre processus) doublé d'un verrou de thread (dans le processus).
+- Les modifications arrivées pendant qu'une écriture est en cours sont
+  regroupées : une seule lecture et une seule écriture par fichier et par lot.
+- Chaque lot incrémente le compteur de version.json du dossier, que les
+  autres workers consultent pour invalider leurs caches.
+"""
+
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows : verrou limité au processus courant
+    fcntl = None
+
+VERSION = "version.json"
+VERROU = ".ecriture.lock"
+
+
+def lire_json(path, default):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return default
+
+
+def ecrire_json(path, data, compact=False):
+    """Écriture atomique : fichier temporaire dans le même dossier puis os.replace."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            if compact:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            else:
+                json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+_verrous_locaux = {}
+_verrous_locaux_lock = threading.Lock()
+
+
+def _verrou_local(dossier):
+    with _verrous_locaux_lock:
+        return _verrous_locaux.setdefault(dossier, threading.RLock())
+
+
+@contextmanager
+def verrou(dossier):
+    """Verrou exclusif d'écriture sur un dossier (threads et processus)."""
+    with _verrou_local(dossier):
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(dossier, VERROU), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def version(dossier):
+    return lire_json(os.path.join(dossier, VERSION), {}).get("version", 0)
+
+
+class _Modification:
+
+    def __init__(self, fichier, fonction, defaut):
+        self.fichier = fichier
+        self.fonction = fonction
+        self.defaut = defaut
+        self.fait = threading.Event()
+        self.resultat = None
+        self.erreur = None
+        self.version = None
+
+
+class Coordinateur:
+    """
+    Point d'entrée unique des écritures. Une modification est une fonction
+    qui reçoit le contenu courant du fichier, le modifie en place et peut
+    retourner une valeur (renvoyée à l'appelant). Elle ne doit pas laisser
+    de modification partielle si elle lève une exception.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._attente = {}   # {dossier: [_Modification]}
+        self._meneurs = set()
+
+    def modifier(self, dossier, fichier, fonction, defaut=None):
+        m = _Modification(fichier, fonction, defaut)
+        with self._lock:
+            self._attente.setdefault(dossier, []).append(m)
+            meneur = dossier not in self._meneurs
+            if meneur:
+                self._meneurs.add(dossier)
+
+        # le premier arrivé écrit pour tous ceux qui attendent derrière lui
+        if meneur:
+            self._vider(dossier)
+
+        m.fait.wait()
+        if m.erreur is not None:
+            raise m.erreur
+        return m.resultat
+
+    def executer(self, dossier, fonction):
+        """
+        Transaction sur plusieurs fichiers : fonction() est appelée sous le
+        verrou du dossier, dans l'ordre du lot, et fait ses propres écritures
+        (avec ecrire_json). Elle compte comme une modification du lot.
+        """
+        return self.modifier(dossier, None, fonction)
+
+    def remplacer(self, dossier, fichier, data):
+        def remplacement(courant):
+            if isinstance(courant, list):
+                courant[:] = data
+            else:
+                courant.clear()
+                courant.update(data)
+        return self.modifier(dossier, fichier, remplacement, defaut=type(data)())
+
+    def _vider(self, dossier):
+        while True:
+            with self._lock:
+                lot = self._attente.pop(dossier, [])
+                if not lot:
+                    self._meneurs.discard(dossier)
+                    return
+            try:
+                with verrou(dossier):
+                    self._appliquer(dossier, lot)
+            except Exception as e:
+                for m in lot:
+                    if m.erreur is None:
+                        m.erreur = e
+            finally:
+                for m in lot:
+                    m.fait.set()
+
+    def _appliquer(self, dossier, lot):
+        contenus = {}
+        modifies = set()
+        ecrit = False
+
+        def ecrire_modifies():
+            nonlocal ecrit
+            ecrit = ecrit or bool(modifies)
+            for fichier in modifies:
+                ecrire_json(os.path.join(dossier, fichier), contenus[fichier])
+            contenus.clear()
+            modifies.clear()
+
+        for m in lot:
+            if m.fichier is None:
+                # transaction : les modifications précédentes doivent être sur disque
+                ecrire_modifies()
+                try:
+                    m.resultat = m.fonction()
+                    ecrit = True
+                except Exception as e:
+                    m.erreur = e
+                continue
+
+            if m.fichier not in contenus:
+                defaut = [] if m.defaut is None else m.defaut
+                contenus[m.fichier] = lire_json(os.path.join(dossier, m.fichier), defaut)
+            try:
+                m.resultat = m.fonction(contenus[m.fichier])
+                modifies.add(m.fichier)
+            except Exception as e:
+                m.erreur = e
+
+        ecrire_modifies()
+        if not ecrit:
+            return
+
+        n = version(dossier) + 1
+        ecrire_json(os.path.join(dossier, VERSION), {"version": n})
+        for m in lot:
+            m.version = n
+
+
+coordinateur = Coordinateur()
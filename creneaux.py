@@ -0,0 +1,51 @@
+"""
+Grille horaire commune : conversion des heures "HHhMM" et découpage de la
+journée en créneaux réguliers de PAS minutes.
+"""
+
+DEBUT_GRILLE = 7 * 60
+FIN_GRILLE = 20 * 60
+PAS = 15
+NB_CRENEAUX = (FIN_GRILLE - DEBUT_GRILLE) // PAS
+
+# Une salle est réservée pour toute la demi-journée (cf. generer_salles_automatiques)
+MIDI = 13 * 60
+DEMI_JOURNEES = {
+    "MATIN": (DEBUT_GRILLE, MIDI),
+    "APRES_MIDI": (MIDI, FIN_GRILLE),
+}
+
+
+def to_minutes(h):
+    h = h.replace("h", ":")
+    hh, mm = h.split(":")
+    return int(hh) * 60 + int(mm)
+
+
+def en_heure(minutes):
+    return f"{minutes // 60:02d}h{minutes % 60:02d}"
+
+
+def periode(h_debut):
+    return "MATIN" if to_minutes(h_debut) < MIDI else "APRES_MIDI"
+
+
+def creneaux(debut, fin):
+    """
+    Indices [premier, dernier[ des créneaux couverts par l'intervalle
+    [debut, fin[ exprimé en minutes, bornés à la grille.
+    """
+    premier = max(0, (debut - DEBUT_GRILLE) // PAS)
+    dernier = min(NB_CRENEAUX, -(-(fin - DEBUT_GRILLE) // PAS))
+    return premier, dernier
+
+
+def etendue_reservation(h_debut, h_fin):
+    """
+    Créneaux [premier, dernier[ bloqués par un cours : toute sa demi-journée,
+    et au-delà s'il déborde. Lève ValueError si les heures sont illisibles.
+    """
+    debut = to_minutes(h_debut)
+    fin = to_minutes(h_fin)
+    p_debut, p_fin = DEMI_JOURNEES[periode(h_debut)]
+    return creneaux(min(debut, p_debut), max(fin, p_fin))
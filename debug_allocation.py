@@ -1,8 +1,7 @@
-import json
+from stockage import stock
 
-# Charger le JSON généré
-with open('data/output/2025-2026/cours_planifies.json', 'r', encoding='utf-8') as f:
-    courses = json.load(f)
+# Charger les cours générés
+courses = stock('data/output/2025-2026').cours()
 
 # Récupérer seulement 5 février matin
 morning_courses = [c for c in courses if c['date'] == '2026-02-05' and int(c['heure_debut'].split('h')[0]) < 12]
@@ -0,0 +1,215 @@
+"""
+Exports iCalendar (.ics) et CSV des cours.
+
+Les documents sont produits ligne par ligne (générateurs) et recopiés au
+passage dans un fichier de cache propre à la version des données : les
+requêtes suivantes, tant que rien n'a changé, servent ce fichier ou un
+simple 304. Le nombre de fichiers de cache est borné (MAX_CACHE).
+"""
+
+import csv
+import hashlib
+import io
+import os
+import re
+import tempfile
+from datetime import datetime, timezone
+
+from creneaux import to_minutes
+
+FUSEAU = "Europe/Paris"
+MAX_CACHE = 200  # exports gardés sur disque (data/output/<annee>/exports)
+
+VTIMEZONE = [
+    "BEGIN:VTIMEZONE",
+    f"TZID:{FUSEAU}",
+    "BEGIN:DAYLIGHT",
+    "TZOFFSETFROM:+0100",
+    "TZOFFSETTO:+0200",
+    "TZNAME:CEST",
+    "DTSTART:19700329T020000",
+    "RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU",
+    "END:DAYLIGHT",
+    "BEGIN:STANDARD",
+    "TZOFFSETFROM:+0200",
+    "TZOFFSETTO:+0100",
+    "TZNAME:CET",
+    "DTSTART:19701025T030000",
+    "RRULE:FREQ=YEARLY;BYMONTH=10;BYDAY=-1SU",
+    "END:STANDARD",
+    "END:VTIMEZONE",
+]
+
+COLONNES_CSV = ["date", "heure_debut", "heure_fin", "formation", "matiere_nom", "enseignant", "salle"]
+
+
+def enseignant(matiere_nom):
+    """ "U51 - Droit des régimes matrimoniaux - P. RAMON (9h-12h)" -> "P. RAMON" """
+    texte = re.sub(r"\s*\([^)]*\)\s*$", "", matiere_nom)
+    morceaux = [m.strip() for m in texte.split(" - ")]
+    if len(morceaux) < 3:
+        return None
+    return morceaux[-1] or None
+
+
+def filtrer(cours, formation=None, salle=None, prof=None, du=None, au=None):
+    prof = prof.upper() if prof else None
+    for c in cours:
+        if formation and c["formation"] != formation:
+            continue
+        if salle and (c.get("salle") or "") != salle:
+            continue
+        if du and c["date"] < du:
+            continue
+        if au and c["date"] > au:
+            continue
+        if prof and prof not in (enseignant(c["matiere_nom"]) or "").upper():
+            continue
+        yield c
+
+
+# ----------------------
+# iCalendar
+# ----------------------
+
+def _echapper(texte):
+    return (
+        texte.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+    )
+
+
+def _plier(ligne):
+    """Repli des lignes à 75 octets (RFC 5545 §3.1)."""
+    octets = ligne.encode("utf-8")
+    if len(octets) <= 75:
+        return ligne + "\r\n"
+    morceaux, courant = [], ""
+    for car in ligne:
+        limite = 75 if not morceaux else 74
+        if len((courant + car).encode("utf-8")) > limite:
+            morceaux.append(courant)
+            courant = car
+        else:
+            courant += car
+    morceaux.append(courant)
+    return "\r\n ".join(morceaux) + "\r\n"
+
+
+def _horodatage(jour, heure):
+    m = to_minutes(heure)
+    return f"{jour.replace('-', '')}T{m // 60:02d}{m % 60:02d}00"
+
+
+def lignes_ics(cours, nom):
+    maintenant = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+    yield "BEGIN:VCALENDAR\r\n"
+    yield "VERSION:2.0\r\n"
+    yield "PRODID:-//planning-automatise//FR\r\n"
+    yield "CALSCALE:GREGORIAN\r\n"
+    yield _plier(f"X-WR-CALNAME:{_echapper(nom)}")
+    yield f"X-WR-TIMEZONE:{FUSEAU}\r\n"
+    for ligne in VTIMEZONE:
+        yield ligne + "\r\n"
+
+    for c in cours:
+        try:
+            debut = _horodatage(c["date"], c["heure_debut"])
+            fin = _horodatage(c["date"], c["heure_fin"])
+        except ValueError:
+            continue
+        uid = hashlib.sha1(
+            "|".join((c["date"], c["heure_debut"], c["formation"], c["matiere_nom"])).encode("utf-8")
+        ).hexdigest()
+
+        yield "BEGIN:VEVENT\r\n"
+        yield f"UID:{uid}@planning-automatise\r\n"
+        yield f"DTSTAMP:{maintenant}\r\n"
+        yield f"DTSTART;TZID={FUSEAU}:{debut}\r\n"
+        yield f"DTEND;TZID={FUSEAU}:{fin}\r\n"
+        yield _plier(f"SUMMARY:{_echapper(c['matiere_nom'])}")
+        yield _plier(f"DESCRIPTION:{_echapper(c['formation'])}")
+        if c.get("salle"):
+            yield _plier(f"LOCATION:{_echapper(c['salle'])}")
+        yield "END:VEVENT\r\n"
+
+    yield "END:VCALENDAR\r\n"
+
+
+# ----------------------
+# CSV
+# ----------------------
+
+def lignes_csv(cours):
+    tampon = io.StringIO()
+    ecrivain = csv.writer(tampon, delimiter=";")
+
+    def ligne(valeurs):
+        ecrivain.writerow(valeurs)
+        texte = tampon.getvalue()
+        tampon.seek(0)
+        tampon.truncate()
+        return texte
+
+    yield "\ufeff" + ligne(COLONNES_CSV)
+    for c in cours:
+        yield ligne([
+            c["date"], c["heure_debut"], c["heure_fin"], c["formation"],
+            c["matiere_nom"], enseignant(c["matiere_nom"]) or "", c.get("salle") or ""
+        ])
+
+
+# ----------------------
+# cache
+# ----------------------
+
+def chemin_cache(dossier, cle, version, extension):
+    return os.path.join(dossier, f"{cle}-{version}.{extension}")
+
+
+def avec_cache(lignes, path, garder=None):
+    """
+    Transmet les lignes telles quelles en les recopiant dans `path`.
+    Le fichier n'apparaît qu'une fois le document complet ; les anciennes
+    versions du même export sont alors supprimées, puis les exports les
+    moins récents au-delà de `garder` fichiers (MAX_CACHE par défaut).
+    """
+    garder = MAX_CACHE if garder is None else garder
+    dossier = os.path.dirname(path)
+    os.makedirs(dossier, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dossier, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    complet = False
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            for ligne in lignes:
+                f.write(ligne)
+                yield ligne
+        os.replace(tmp, path)
+        complet = True
+    finally:
+        if not complet:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    cle = os.path.basename(path).split("-")[0]
+    restants = []
+    for nom in os.listdir(dossier):
+        chemin = os.path.join(dossier, nom)
+        if nom.endswith(".tmp") or chemin == path:
+            continue
+        try:
+            if nom.startswith(cle + "-"):
+                os.remove(chemin)
+            else:
+                restants.append((os.path.getmtime(chemin), chemin))
+        except OSError:
+            pass
+
+    restants.sort()
+    for _, chemin in restants[:max(0, len(restants) + 1 - garder)]:
+        try:
+            os.remove(chemin)
+        except OSError:
+            pass
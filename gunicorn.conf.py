@@ -0,0 +1,29 @@
+"""
+Configuration gunicorn :  gunicorn -c gunicorn.conf.py
+
+L'application est construite une seule fois dans le maître (preload) :
+références, gabarits et index des cours sont ensuite partagés par les
+workers en copie à l'écriture. Un worker qui redémarre est donc prêt
+immédiatement, sans relire les fichiers.
+"""
+
+import gc
+import os
+
+wsgi_app = "app:creer_app()"
+preload_app = True
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", 4))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+
+
+def pre_fork(server, worker):
+    # les objets préchargés ne bougent plus : le ramasse-miettes ne les
+    # touche pas dans les workers, leurs pages mémoire restent partagées
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import app
+    app.apres_fork()
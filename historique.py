@@ -0,0 +1,163 @@
+"""
+Historique des cours de l'année : chaque écriture du stock (import,
+attribution des salles, saisie dans /preview, suppression) devient une
+version numérotée.
+
+Une version n'est pas une copie : on n'enregistre, par formation touchée,
+que la différence avec l'état précédent — les blocs de cours ajoutés ou
+retirés et les changements de salle, repérés par la position des cours.
+Revenir en arrière applique ces différences à l'envers, de la version
+courante jusqu'à la version visée, sans relire les autres formations.
+
+    <annee>/cours/historique/journal.json   {"versions": [{"n", "date", "motif", "formations", "octets"}]}
+    <annee>/cours/historique/<n>.json       différences de la version n
+"""
+
+import os
+from datetime import datetime
+from difflib import SequenceMatcher
+
+from coordination import ecrire_json, lire_json
+
+DOSSIER = "historique"
+JOURNAL = "journal.json"
+MAX_VERSIONS = 200
+
+
+def _cle(c):
+    """Identité d'un cours, salle exclue."""
+    return tuple(sorted((k, v) for k, v in c.items() if k != "salle"))
+
+
+def difference(avant, apres):
+    """
+    Différence entre deux listes de cours d'une formation, ou None si elles
+    sont identiques :
+      {"blocs": [[op, i1, i2, j1, j2, retires, ajoutes], ...],
+       "salles": [[i, j, salle_avant, salle_apres, date, heure_debut], ...]}
+    Les blocs "equal" ne portent pas de cours, seulement les positions.
+    """
+    cles_avant = [_cle(c) for c in avant]
+    cles_apres = [_cle(c) for c in apres]
+    if cles_avant == cles_apres:
+        operations = [("equal", 0, len(avant), 0, len(apres))] if avant else []
+    else:
+        operations = SequenceMatcher(None, cles_avant, cles_apres, autojunk=False).get_opcodes()
+
+    blocs, salles = [], []
+    for op, i1, i2, j1, j2 in operations:
+        if op == "equal":
+            blocs.append([op, i1, i2, j1, j2, None, None])
+            for i, j in zip(range(i1, i2), range(j1, j2)):
+                if avant[i].get("salle") != apres[j].get("salle"):
+                    salles.append([
+                        i, j, avant[i].get("salle"), apres[j].get("salle"),
+                        apres[j]["date"], apres[j]["heure_debut"]
+                    ])
+        else:
+            blocs.append([op, i1, i2, j1, j2, avant[i1:i2], apres[j1:j2]])
+
+    if not salles and all(b[0] == "equal" for b in blocs):
+        return None
+    return {"blocs": blocs, "salles": salles}
+
+
+def restaurer(apres, diff):
+    """Reconstruit la liste d'avant à partir de la liste d'après."""
+    salles = {s[1]: s[2] for s in diff["salles"]}
+    avant = []
+    for op, i1, i2, j1, j2, retires, _ in diff["blocs"]:
+        if op != "equal":
+            avant.extend(dict(c) for c in retires)
+            continue
+        for j in range(j1, j2):
+            c = apres[j]
+            if j in salles:
+                c = {**c, "salle": salles[j]}
+            avant.append(c)
+    return avant
+
+
+def resume(diff):
+    if diff is None:
+        return {"ajoutes": 0, "retires": 0, "salles": 0}
+    return {
+        "ajoutes": sum(len(b[6]) for b in diff["blocs"] if b[0] != "equal"),
+        "retires": sum(len(b[5]) for b in diff["blocs"] if b[0] != "equal"),
+        "salles": len(diff["salles"])
+    }
+
+
+class Historique:
+    """À utiliser sous le verrou d'écriture du dossier de l'année (transactions du stock)."""
+
+    def __init__(self, dossier_cours):
+        self.dossier = os.path.join(dossier_cours, DOSSIER)
+
+    def _chemin(self, nom):
+        return os.path.join(self.dossier, nom)
+
+    def versions(self):
+        return lire_json(self._chemin(JOURNAL), {}).get("versions", [])
+
+    def courante(self):
+        versions = self.versions()
+        return versions[-1]["n"] if versions else 0
+
+    def charger(self, n):
+        return lire_json(self._chemin(f"{n}.json"), None)
+
+    def enregistrer(self, motif, changements):
+        """
+        changements : {formation: (infos_avant, cours_avant, infos_apres, cours_apres)}
+        où infos est l'entrée du manifeste (None si la formation n'existe pas).
+        Retourne le numéro de la nouvelle version, ou None si rien n'a changé.
+        """
+        formations = {}
+        for f, (infos_avant, avant, infos_apres, apres) in changements.items():
+            diff = difference(avant, apres)
+            if diff is None and (infos_avant is None) == (infos_apres is None):
+                continue
+            formations[f] = {
+                "infos_avant": _infos(infos_avant),
+                "infos_apres": _infos(infos_apres),
+                "diff": diff
+            }
+        if not formations:
+            return None
+
+        os.makedirs(self.dossier, exist_ok=True)
+        journal = self.versions()
+        n = journal[-1]["n"] + 1 if journal else 1
+        path = self._chemin(f"{n}.json")
+        ecrire_json(path, {"n": n, "formations": formations}, compact=True)
+
+        journal.append({
+            "n": n,
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "motif": motif,
+            "formations": {f: resume(d["diff"]) for f, d in formations.items()},
+            "octets": os.path.getsize(path)
+        })
+        for ancienne in journal[:-MAX_VERSIONS]:
+            try:
+                os.remove(self._chemin(f"{ancienne['n']}.json"))
+            except OSError:
+                pass
+        ecrire_json(self._chemin(JOURNAL), {"versions": journal[-MAX_VERSIONS:]})
+        return n
+
+    def a_defaire(self, n):
+        """Versions à défaire (de la plus récente à la plus ancienne) pour revenir à la version n."""
+        versions = self.versions()
+        if not versions or n >= versions[-1]["n"]:
+            return []
+        if n < versions[0]["n"] - 1:
+            raise ValueError(f"version {n} trop ancienne (historique conservé depuis {versions[0]['n'] - 1})")
+        return [v["n"] for v in reversed(versions) if v["n"] > n]
+
+
+def _infos(infos):
+    if infos is None:
+        return None
+    return {k: v for k, v in infos.items() if k != "jours"}
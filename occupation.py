@@ -0,0 +1,145 @@
+"""
+Occupation des salles sous forme de bitmaps.
+
+Pour chaque jour, on garde une liste de NB_CRENEAUX entiers : le bit i du
+créneau k vaut 1 si la i-ème salle de charger_salles() (triées par capacité
+croissante) est occupée pendant ce créneau. Une recherche de salle libre se
+réduit alors à quelques OR / AND sur des entiers.
+"""
+
+from bisect import bisect_left
+from datetime import timedelta
+
+from creneaux import NB_CRENEAUX, PAS, DEBUT_GRILLE, creneaux, etendue_reservation
+
+
+class IndexOccupation:
+
+    def __init__(self, salles):
+        # salles : liste triée par capacité (charger_salles)
+        self.salles = salles
+        self.rang = {s["code"]: i for i, s in enumerate(salles)}
+        self.capacites = [s["capacite"] for s in salles]
+        self.toutes = (1 << len(salles)) - 1
+        self.accessibles = 0
+        for i, s in enumerate(salles):
+            if s["accessible"] == "OUI":
+                self.accessibles |= 1 << i
+
+        self.jours = {}        # {date iso: [masque des salles occupées par créneau]}
+        self._signatures = {}  # {date iso: signature des cours du jour}
+
+    # ----------------------
+    # construction / mise à jour
+    # ----------------------
+
+    def _construire_jour(self, cours_jour):
+        occ = [0] * NB_CRENEAUX
+        for c in cours_jour:
+            bit = self.rang.get((c.get("salle") or "").strip())
+            if bit is None:
+                continue
+            try:
+                premier, dernier = etendue_reservation(c["heure_debut"], c["heure_fin"])
+            except (ValueError, KeyError):
+                continue
+
+            masque = 1 << bit
+            for k in range(premier, dernier):
+                occ[k] |= masque
+        return occ
+
+    def synchroniser(self, cours):
+        """
+        Aligne l'index sur la liste de cours : seuls les jours dont les
+        affectations ont changé sont recalculés. Retourne ces jours.
+        """
+        par_date = {}
+        for c in cours:
+            par_date.setdefault(c["date"], []).append(c)
+
+        modifies = set()
+        for d, liste in par_date.items():
+            signature = sorted(
+                (c.get("salle") or "", c["heure_debut"], c["heure_fin"]) for c in liste
+            )
+            if self._signatures.get(d) != signature:
+                self._signatures[d] = signature
+                self.jours[d] = self._construire_jour(liste)
+                modifies.add(d)
+
+        for d in set(self.jours) - set(par_date):
+            del self.jours[d]
+            del self._signatures[d]
+            modifies.add(d)
+
+        return modifies
+
+    # ----------------------
+    # requêtes
+    # ----------------------
+
+    def candidates(self, capacite=0, accessible=False):
+        """Masque des salles assez grandes (et accessibles si demandé)."""
+        masque = self.toutes & ~((1 << bisect_left(self.capacites, capacite)) - 1)
+        if accessible:
+            masque &= self.accessibles
+        return masque
+
+    def occupees(self, jour, debut, fin):
+        occ = self.jours.get(jour)
+        if occ is None:
+            return 0
+        premier, dernier = creneaux(debut, fin)
+        masque = 0
+        for k in range(premier, dernier):
+            masque |= occ[k]
+        return masque
+
+    def _salles(self, masque):
+        return [s for i, s in enumerate(self.salles) if masque >> i & 1]
+
+    def salles_libres(self, jour, debut, fin, capacite=0, accessible=False):
+        """Salles libres le jour donné sur [debut, fin[ (minutes), par capacité croissante."""
+        libres = self.candidates(capacite, accessible) & ~self.occupees(jour, debut, fin)
+        return self._salles(libres)
+
+    def premier_creneau_libre(self, du, au, duree, capacite=0, accessible=False,
+                              heure_min=8 * 60 + 30, heure_max=17 * 60 + 30, debut=None):
+        """
+        Premier (jour, début) entre les dates du et au (incluses, jours ouvrés)
+        où une salle convenable est libre pendant `duree` minutes.
+        Si `debut` est fourni, seul cet horaire est examiné chaque jour.
+        Retourne (jour iso, debut, fin, salles) ou None.
+        """
+        cand = self.candidates(capacite, accessible)
+        if not cand:
+            return None
+
+        if debut is not None:
+            departs = [debut]
+        else:
+            premier = -(-(heure_min - DEBUT_GRILLE) // PAS) * PAS + DEBUT_GRILLE
+            departs = range(premier, heure_max - duree + 1, PAS)
+
+        jour = du
+        while jour <= au:
+            if jour.weekday() < 5:
+                iso = jour.isoformat()
+                occ = self.jours.get(iso)
+                for h in departs:
+                    if occ is None:
+                        libres = cand
+                    else:
+                        premier_k, dernier_k = creneaux(h, h + duree)
+                        pris = 0
+                        for k in range(premier_k, dernier_k):
+                            pris |= occ[k]
+                            if pris & cand == cand:
+                                break
+                        libres = cand & ~pris
+                    if libres:
+                        return iso, h, h + duree, self._salles(libres)
+            jour += timedelta(days=1)
+
+        return None
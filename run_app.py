@@ -5,7 +5,7 @@ try:
     import app
     print("OK - Import OK")
     print("Starting Flask...")
-    app.app.run(debug=True)
+    app.creer_app().run(debug=True)
 except Exception as e:
     import traceback
     print(f"ERROR: {e}")
@@ -0,0 +1,72 @@
+"""
+Simulation « et si » : effet d'un changement d'effectifs, d'accessibilité
+ou de liste de salles sur l'attribution des salles, sans rien enregistrer.
+
+Seuls les jours où les formations concernées ont cours sont recalculés
+(l'attribution est indépendante d'un jour à l'autre). Les cours de ces
+jours sont copiés sans leur salle et attribués deux fois : avec les
+données actuelles (référence) puis avec l'hypothèse. Les changements sont
+la différence entre les deux, si bien que les saisies manuelles ne
+passent pas pour un effet de l'hypothèse. La liste d'origine n'est jamais
+modifiée.
+"""
+
+CHAMPS_COURS = ("date", "heure_debut", "heure_fin", "formation", "matiere_nom")
+
+
+def formations_concernees(effectifs, access, effectifs_hyp, access_hyp):
+    concernees = set()
+    for f, v in (effectifs_hyp or {}).items():
+        if effectifs.get(f, 0) != v:
+            concernees.add(f)
+    for f, v in (access_hyp or {}).items():
+        if bool(access.get(f, False)) != bool(v):
+            concernees.add(f)
+    return concernees
+
+
+def simuler(cours, allouer, salles, effectifs, access,
+            effectifs_hyp=None, access_hyp=None, salles_hyp=None):
+    """
+    allouer : fonction d'attribution (generer_salles_automatiques).
+    Retourne les jours recalculés, les changements de salle par rapport à
+    une attribution des mêmes jours sans l'hypothèse et les cours qui
+    perdraient leur salle.
+    """
+    effectifs_sim = {**effectifs, **(effectifs_hyp or {})}
+    access_sim = {**access, **(access_hyp or {})}
+
+    if salles_hyp is not None:
+        # nouvelle liste de salles : tous les jours sont concernés
+        jours = {c["date"] for c in cours}
+        formations = None
+    else:
+        formations = formations_concernees(effectifs, access, effectifs_hyp, access_hyp)
+        jours = {c["date"] for c in cours if c["formation"] in formations}
+
+    originaux = [c for c in cours if c["date"] in jours]
+    reference = [{**c, "salle": None} for c in originaux]
+    copies = [{**c, "salle": None} for c in originaux]
+    allouer(reference, salles, effectifs, access)
+    allouer(copies, salles if salles_hyp is None else salles_hyp, effectifs_sim, access_sim)
+
+    changements = []
+    sans_salle = []
+    for avant, apres in zip(reference, copies):
+        if avant.get("salle") == apres.get("salle"):
+            continue
+        ligne = {k: avant[k] for k in CHAMPS_COURS}
+        ligne["avant"] = avant.get("salle")
+        ligne["apres"] = apres.get("salle")
+        changements.append(ligne)
+        if ligne["avant"] is not None and ligne["apres"] is None:
+            sans_salle.append(ligne)
+
+    return {
+        "formations": sorted(formations) if formations is not None else None,
+        "jours": sorted(jours),
+        "cours_recalcules": len(copies),
+        "changements": changements,
+        "nouveaux_sans_salle": sans_salle,
+        "sans_salle_total": sum(1 for c in copies if c.get("salle") is None)
+    }
@@ -0,0 +1,477 @@
+"""
+Stockage des cours de l'année, partitionné par formation.
+
+    <annee>/cours/manifeste.json   {"formations": {nom: {"fichier", "source", "hash_source", "importe_le",
+                                                          "lignes", "debut", "fin", "sans_salle", "jours"}}}
+    <annee>/cours/<fichier>.json   cours d'une formation, dans l'ordre du CSV
+
+Remplacer, supprimer ou recharger une formation ne réécrit que sa
+partition et le manifeste. Les lecteurs de toute l'année passent par un
+index des dates fusionné (construit paresseusement, conservé tant que la
+version de l'année ne change pas) : lire une journée ne matérialise pas la
+liste complète.
+
+Le manifeste porte aussi, par formation, les statistiques d'import
+(nombre de cours, période couverte, cours sans salle) et un résumé de chaque jour
+(cours, cours sans salle, présence le matin / l'après-midi), recalculé
+uniquement pour les partitions réécrites : le calendrier de l'année s'en
+déduit sans relire les cours.
+
+Les requêtes sur une période s'appuient sur un index par formation : les
+clés (date, minute de début) triées, qu'une recherche dichotomique découpe.
+
+Les écritures sont des transactions du coordinateur (verrou, version) et
+chacune est enregistrée dans l'historique (cf. historique.py).
+Les listes renvoyées par les lectures sont partagées : ne pas les modifier,
+passer par modifier().
+"""
+
+import hashlib
+import heapq
+import os
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+from coordination import coordinateur, ecrire_json, lire_json, version
+from creneaux import periode, to_minutes
+import historique
+
+DOSSIER = "cours"
+MANIFESTE = "manifeste.json"
+ANCIEN = "cours_planifies.json"
+MIGRE = "cours_planifies.migre.json"
+
+
+def hash_fichier(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for bloc in iter(lambda: f.read(1 << 16), b""):
+            h.update(bloc)
+    return h.hexdigest()
+
+
+def _signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _cle(c):
+    try:
+        return (c["date"], to_minutes(c["heure_debut"]))
+    except (ValueError, AttributeError):
+        return (c["date"], -1)
+
+
+def resume_jours(cours):
+    """{date: [cours, sans_salle, matin, apres_midi]} pour les cours d'une formation."""
+    jours = {}
+    for c in cours:
+        r = jours.setdefault(c["date"], [0, 0, 0, 0])
+        r[0] += 1
+        if c.get("salle") is None:
+            r[1] += 1
+        try:
+            r[2 if periode(c["heure_debut"]) == "MATIN" else 3] = 1
+        except (ValueError, AttributeError):
+            pass
+    return jours
+
+
+def statistiques(cours):
+    """Champs du manifeste qui dépendent du contenu de la partition."""
+    jours = resume_jours(cours)
+    return {
+        "lignes": len(cours),
+        "debut": min(jours) if jours else None,
+        "fin": max(jours) if jours else None,
+        "sans_salle": sum(r[1] for r in jours.values()),
+        "jours": jours
+    }
+
+
+def _nom_fichier(formation, pris):
+    base = re.sub(r"[^A-Za-z0-9]+", "_", formation).strip("_").lower() or "formation"
+    nom, n = f"{base}.json", 2
+    while nom in pris:
+        nom, n = f"{base}_{n}.json", n + 1
+    return nom
+
+
+class Stock:
+
+    def __init__(self, base):
+        self.base = base
+        self.dossier = os.path.join(base, DOSSIER)
+        self._lock = threading.Lock()
+        self._version = None
+        self._manifeste = {}
+        self._partitions = {}  # {formation: (fichier, signature, cours)}
+        self._index = None     # {date: [(formation, i)]}
+        self._dates = None
+        self._fusion = None
+        self._intervalles = {}  # {formation: (cours, clés triées, cours triés)}
+        self._resumes = None
+
+    # ----------------------
+    # lecture
+    # ----------------------
+
+    def _chemin(self, fichier):
+        return os.path.join(self.dossier, fichier)
+
+    def _lire_manifeste(self):
+        return lire_json(self._chemin(MANIFESTE), {}).get("formations", {})
+
+    def _rafraichir(self):
+        """Recharge les partitions modifiées depuis la dernière lecture (sous self._lock)."""
+        v = version(self.base)
+        if v == self._version:
+            return
+
+        if not os.path.exists(self._chemin(MANIFESTE)):
+            coordinateur.executer(self.base, self._migrer)
+            v = version(self.base)
+
+        manifeste = self._lire_manifeste()
+        partitions = {}
+        change = list(manifeste) != list(self._manifeste)
+        for f, infos in manifeste.items():
+            path = self._chemin(infos["fichier"])
+            sig = _signature(path)
+            ancien = self._partitions.get(f)
+            if ancien and ancien[0] == infos["fichier"] and ancien[1] == sig:
+                partitions[f] = ancien
+            else:
+                partitions[f] = (infos["fichier"], sig, lire_json(path, []))
+                change = True
+
+        self._manifeste = manifeste
+        self._partitions = partitions
+        self._version = v
+        self._intervalles = {f: i for f, i in self._intervalles.items() if f in partitions}
+        self._resumes = None
+        if change:
+            self._index = self._dates = self._fusion = None
+
+    def _construire_index(self):
+        if self._index is None:
+            index = {}
+            for f, (_, _, cours) in self._partitions.items():
+                for i, c in enumerate(cours):
+                    index.setdefault(c["date"], []).append((f, i))
+            self._index = index
+            self._dates = sorted(index)
+        return self._index
+
+    def manifeste(self):
+        with self._lock:
+            self._rafraichir()
+            return {f: dict(infos) for f, infos in self._manifeste.items()}
+
+    def partition(self, formation):
+        with self._lock:
+            self._rafraichir()
+            p = self._partitions.get(formation)
+            return p[2] if p else []
+
+    def dates(self):
+        with self._lock:
+            self._rafraichir()
+            self._construire_index()
+            return self._dates
+
+    def cours_du_jour(self, jour):
+        with self._lock:
+            self._rafraichir()
+            index = self._construire_index()
+            return [self._partitions[f][2][i] for f, i in index.get(jour, [])]
+
+    def cours(self):
+        """Tous les cours de l'année, par date puis dans l'ordre des formations."""
+        with self._lock:
+            self._rafraichir()
+            if self._fusion is None:
+                index = self._construire_index()
+                self._fusion = [
+                    self._partitions[f][2][i]
+                    for d in self._dates
+                    for f, i in index[d]
+                ]
+            return self._fusion
+
+    def resumes(self, du=None, au=None):
+        """
+        {date: {"cours", "formations", "sans_salle", "matin", "apres_midi"}}
+        où matin / apres_midi comptent les formations qui ont besoin d'une salle.
+        """
+        with self._lock:
+            self._rafraichir()
+            if self._resumes is None:
+                resumes = {}
+                for f, infos in self._manifeste.items():
+                    jours = infos.get("jours")
+                    if jours is None:  # manifeste antérieur aux résumés
+                        jours = resume_jours(self._partitions[f][2])
+                    for d, (n, sans_salle, matin, apres_midi) in jours.items():
+                        r = resumes.setdefault(
+                            d, {"cours": 0, "formations": 0, "sans_salle": 0, "matin": 0, "apres_midi": 0}
+                        )
+                        r["cours"] += n
+                        r["formations"] += 1
+                        r["sans_salle"] += sans_salle
+                        r["matin"] += matin
+                        r["apres_midi"] += apres_midi
+                self._resumes = resumes
+            resumes = self._resumes
+        return {
+            d: dict(r) for d, r in resumes.items()
+            if (not du or d >= du) and (not au or d <= au)
+        }
+
+    def etat_imports(self):
+        """{formation: statistiques d'import} tirées du manifeste, sans les résumés par jour."""
+        with self._lock:
+            self._rafraichir()
+            etat = {}
+            for f, infos in self._manifeste.items():
+                if "sans_salle" not in infos:  # manifeste antérieur aux statistiques
+                    infos = {**statistiques(self._partitions[f][2]), **infos}
+                etat[f] = {k: v for k, v in infos.items() if k != "jours"}
+            return etat
+
+    def sans_salle(self):
+        return sum(r["sans_salle"] for r in self.resumes().values())
+
+    def _intervalle(self, formation):
+        cours = self._partitions[formation][2]
+        deja = self._intervalles.get(formation)
+        if deja is None or deja[0] is not cours:
+            tries = sorted(cours, key=_cle)
+            deja = (cours, [_cle(c) for c in tries], tries)
+            self._intervalles[formation] = deja
+        return deja
+
+    def periode(self, du=None, au=None, formations=None):
+        """
+        Cours de du à au inclus (dates ISO), triés par date et heure de début,
+        pour toutes les formations ou celles indiquées. Itérateur paresseux.
+        """
+        with self._lock:
+            self._rafraichir()
+            noms = [f for f in self._partitions if formations is None or f in formations]
+            tranches = []
+            for f in noms:
+                _, cles, tries = self._intervalle(f)
+                i = bisect_left(cles, (du, -1)) if du else 0
+                j = bisect_right(cles, (au, 24 * 60)) if au else len(cles)
+                if i < j:
+                    tranches.append(zip(cles[i:j], tries[i:j]))
+        return (c for _, c in heapq.merge(*tranches, key=lambda e: e[0]))
+
+    # ----------------------
+    # écriture
+    # ----------------------
+
+    def _migrer(self):
+        """Découpe l'ancien cours_planifies.json en partitions (une seule fois)."""
+        if os.path.exists(self._chemin(MANIFESTE)):
+            return
+        os.makedirs(self.dossier, exist_ok=True)
+
+        ancien = os.path.join(self.base, ANCIEN)
+        par_formation = {}
+        for c in lire_json(ancien, []):
+            par_formation.setdefault(c["formation"], []).append(c)
+
+        manifeste = {}
+        for f, cours in par_formation.items():
+            fichier = _nom_fichier(f, {i["fichier"] for i in manifeste.values()})
+            ecrire_json(self._chemin(fichier), cours)
+            manifeste[f] = {
+                "fichier": fichier, "source": None, "hash_source": None, "importe_le": None,
+                **statistiques(cours)
+            }
+        ecrire_json(self._chemin(MANIFESTE), {"formations": manifeste})
+
+        if os.path.exists(ancien):
+            os.replace(ancien, os.path.join(self.base, MIGRE))
+
+    def _transaction(self, fonction):
+        def transaction():
+            self._migrer()
+            return fonction(self._lire_manifeste())
+        return coordinateur.executer(self.base, transaction)
+
+    def _lire_partition(self, infos):
+        return lire_json(self._chemin(infos["fichier"]), []) if infos else []
+
+    def _historiser(self, motif, changements):
+        return historique.Historique(self.dossier).enregistrer(motif, changements)
+
+    def remplacer_formation(self, formation, cours, source=None, hash_source=None, motif=None):
+        def remplacer(manifeste):
+            avant = manifeste.get(formation)
+            cours_avant = self._lire_partition(avant)
+            infos = dict(avant) if avant else {
+                "fichier": _nom_fichier(formation, {i["fichier"] for i in manifeste.values()})
+            }
+            ecrire_json(self._chemin(infos["fichier"]), cours)
+            infos.update(
+                source=source, hash_source=hash_source,
+                importe_le=datetime.now().isoformat(timespec="seconds"),
+                **statistiques(cours)
+            )
+            manifeste[formation] = infos
+            ecrire_json(self._chemin(MANIFESTE), {"formations": manifeste})
+            self._historiser(motif or f"import {formation}", {formation: (avant, cours_avant, infos, cours)})
+            return dict(infos)
+        return self._transaction(remplacer)
+
+    def supprimer_formation(self, formation, motif=None):
+        def supprimer(manifeste):
+            infos = manifeste.pop(formation, None)
+            if infos is None:
+                return False
+            cours = self._lire_partition(infos)
+            ecrire_json(self._chemin(MANIFESTE), {"formations": manifeste})
+            try:
+                os.remove(self._chemin(infos["fichier"]))
+            except OSError:
+                pass
+            self._historiser(motif or f"suppression {formation}", {formation: (infos, cours, None, [])})
+            return True
+        return self._transaction(supprimer)
+
+    def vider(self, motif="réinitialisation des imports"):
+        def vider(manifeste):
+            changements = {f: (infos, self._lire_partition(infos), None, []) for f, infos in manifeste.items()}
+            ecrire_json(self._chemin(MANIFESTE), {"formations": {}})
+            for infos in manifeste.values():
+                try:
+                    os.remove(self._chemin(infos["fichier"]))
+                except OSError:
+                    pass
+            self._historiser(motif, changements)
+        return self._transaction(vider)
+
+    def restaurer(self, n):
+        """
+        Revient à la version n de l'historique en défaisant les versions
+        suivantes ; seules les formations qu'elles touchent sont relues.
+        Le retour est lui-même une nouvelle version (et peut être défait).
+        """
+        def restaurer(manifeste):
+            hist = historique.Historique(self.dossier)
+            originaux, etat = {}, {}
+            for v in hist.a_defaire(n):
+                version_v = hist.charger(v)
+                if version_v is None:
+                    raise ValueError(f"version {v} introuvable")
+                for f, d in version_v["formations"].items():
+                    if f not in etat:
+                        originaux[f] = etat[f] = (manifeste.get(f), self._lire_partition(manifeste.get(f)))
+                    cours = etat[f][1]
+                    if d["diff"] is not None:
+                        cours = historique.restaurer(cours, d["diff"])
+                    etat[f] = (d["infos_avant"], cours)
+
+            changements = {}
+            for f, (infos, cours) in etat.items():
+                actuel = manifeste.get(f)
+                if infos is None:
+                    if actuel is not None:
+                        manifeste.pop(f)
+                        try:
+                            os.remove(self._chemin(actuel["fichier"]))
+                        except OSError:
+                            pass
+                else:
+                    fichier = actuel["fichier"] if actuel else _nom_fichier(
+                        f, {i["fichier"] for i in manifeste.values()}
+                    )
+                    infos = {**infos, "fichier": fichier, **statistiques(cours)}
+                    ecrire_json(self._chemin(fichier), cours)
+                    manifeste[f] = infos
+                changements[f] = (*originaux[f], infos, cours)
+
+            if changements:
+                ecrire_json(self._chemin(MANIFESTE), {"formations": manifeste})
+            return self._historiser(f"retour à la version {n}", changements)
+        return self._transaction(restaurer)
+
+    def historique(self):
+        """Versions enregistrées, de la plus ancienne à la plus récente."""
+        return historique.Historique(self.dossier).versions()
+
+    def differences(self, de, a):
+        """
+        Détail des changements des versions de+1 à a :
+        [{"n", "date", "motif", "formations": {f: {"ajoutes", "retires", "salles"}}}]
+        """
+        hist = historique.Historique(self.dossier)
+        detail = []
+        for v in hist.versions():
+            if not de < v["n"] <= a:
+                continue
+            contenu = hist.charger(v["n"]) or {"formations": {}}
+            formations = {}
+            for f, d in contenu["formations"].items():
+                diff = d["diff"] or {"blocs": [], "salles": []}
+                formations[f] = {
+                    "ajoutes": [c for b in diff["blocs"] if b[0] != "equal" for c in b[6]],
+                    "retires": [c for b in diff["blocs"] if b[0] != "equal" for c in b[5]],
+                    "salles": [
+                        {"date": s[4], "heure_debut": s[5], "avant": s[2], "apres": s[3]}
+                        for s in diff["salles"]
+                    ]
+                }
+            detail.append({"n": v["n"], "date": v["date"], "motif": v["motif"], "formations": formations})
+        return detail
+
+    def modifier(self, fonction, formations=None, motif="modification"):
+        """
+        fonction(cours) modifie en place les cours de l'année (ou des seules
+        formations indiquées), sans en ajouter ni en retirer. Seules les
+        partitions réellement modifiées sont réécrites.
+        """
+        def modifier(manifeste):
+            noms = [f for f in manifeste if formations is None or f in formations]
+            partitions = {f: lire_json(self._chemin(manifeste[f]["fichier"]), []) for f in noms}
+            avant = {f: [dict(c) for c in cours] for f, cours in partitions.items()}
+
+            # même ordre que cours() : par date, puis formation
+            fusion = sorted(
+                (c for cours in partitions.values() for c in cours),
+                key=lambda c: c["date"]
+            )
+            resultat = fonction(fusion)
+
+            modifiees = [f for f, cours in partitions.items() if cours != avant[f]]
+            if modifiees:
+                infos_avant = {f: dict(manifeste[f]) for f in modifiees}
+                for f in modifiees:
+                    ecrire_json(self._chemin(manifeste[f]["fichier"]), partitions[f])
+                    manifeste[f].update(statistiques(partitions[f]))
+                ecrire_json(self._chemin(MANIFESTE), {"formations": manifeste})
+                self._historiser(motif, {
+                    f: (infos_avant[f], avant[f], manifeste[f], partitions[f]) for f in modifiees
+                })
+            return resultat
+        return self._transaction(modifier)
+
+
+_stocks = {}
+_stocks_lock = threading.Lock()
+
+
+def stock(base):
+    """Instance partagée (par processus) du stock d'une année."""
+    with _stocks_lock:
+        if base not in _stocks:
+            _stocks[base] = Stock(base)
+        return _stocks[base]
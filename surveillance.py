@@ -0,0 +1,149 @@
+"""
+Surveillance du dossier des imports (data/imports).
+
+Un thread relève toutes les `intervalle` secondes la signature (mtime,
+taille) des CSV du dossier (ceux que `retenir` accepte). Un fichier nouveau ou modifié n'est traité
+qu'une fois stable depuis `delai` secondes (une copie ou un
+enregistrement en plusieurs écritures ne déclenche qu'un import) ; son
+contenu n'est relu et haché qu'à ce moment, et seulement s'il a changé
+depuis le dernier import. Un fichier supprimé est signalé une fois.
+
+Avec plusieurs workers gunicorn, un seul surveille le dossier : celui qui
+obtient le verrou fcntl .surveillance.lock (repris par un autre s'il
+s'arrête).
+"""
+
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas d'élection entre processus
+    fcntl = None
+
+from stockage import hash_fichier
+
+VERROU = ".surveillance.lock"
+
+
+class Surveillant:
+    """
+    ingerer(chemin, empreinte) : fichier nouveau ou modifié, stable.
+    retirer(nom_fichier)       : fichier disparu du dossier.
+    connues()                  : {nom_fichier: empreinte} déjà importés (au démarrage).
+    retenir(nom_fichier)       : le fichier est-il à surveiller (par défaut : tout CSV) ?
+    """
+
+    def __init__(self, dossier, ingerer, retirer, connues, intervalle=2.0, delai=3.0, retenir=None):
+        self.dossier = dossier
+        self.ingerer = ingerer
+        self.retirer = retirer
+        self.connues = connues
+        self.retenir = retenir or (lambda nom: nom.lower().endswith(".csv"))
+        self.intervalle = intervalle
+        self.delai = delai
+        self._lock = threading.Lock()
+        self._pid = None
+        self._arret = threading.Event()
+        self._verrou = None
+        self._signatures = {}   # {nom: (signature, vue_le)}
+        self._empreintes = None
+
+    # ----------------------
+    # une passe
+    # ----------------------
+
+    def _csv(self):
+        fichiers = {}
+        try:
+            noms = os.listdir(self.dossier)
+        except OSError:
+            return fichiers
+        for nom in noms:
+            if not self.retenir(nom):
+                continue
+            try:
+                st = os.stat(os.path.join(self.dossier, nom))
+            except OSError:
+                continue
+            fichiers[nom] = (st.st_mtime_ns, st.st_size)
+        return fichiers
+
+    def scanner(self, maintenant=None):
+        """Une passe sur le dossier ; retourne les noms ingérés et retirés."""
+        maintenant = time.monotonic() if maintenant is None else maintenant
+        if self._empreintes is None:
+            self._empreintes = {n: e for n, e in self.connues().items() if self.retenir(n)}
+
+        fichiers = self._csv()
+        ingeres, retires = [], []
+
+        for nom, signature in fichiers.items():
+            ancienne = self._signatures.get(nom)
+            if ancienne is None or ancienne[0] != signature:
+                # nouveau ou encore en cours d'écriture : attendre qu'il soit stable
+                self._signatures[nom] = (signature, maintenant)
+                continue
+            if ancienne[1] is None or maintenant - ancienne[1] < self.delai:
+                continue
+
+            self._signatures[nom] = (signature, None)  # traité pour cette signature
+            chemin = os.path.join(self.dossier, nom)
+            try:
+                empreinte = hash_fichier(chemin)
+            except OSError:
+                continue
+            if self._empreintes.get(nom) == empreinte:
+                continue
+            self._empreintes[nom] = empreinte
+            self.ingerer(chemin, empreinte)
+            ingeres.append(nom)
+
+        for nom in list(self._signatures):
+            if nom not in fichiers:
+                del self._signatures[nom]
+                if self._empreintes.pop(nom, None) is not None:
+                    self.retirer(nom)
+                    retires.append(nom)
+
+        return ingeres, retires
+
+    # ----------------------
+    # thread
+    # ----------------------
+
+    def _elu(self):
+        """Verrou non bloquant : un seul processus surveille le dossier."""
+        if fcntl is None or self._verrou is not None:
+            return True
+        f = open(os.path.join(self.dossier, VERROU), "a")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._verrou = f
+        return True
+
+    def boucle(self):
+        while not self._arret.is_set():
+            if self._elu():
+                try:
+                    self.scanner()
+                except Exception as e:  # la surveillance ne doit pas s'arrêter sur un fichier
+                    print("SURVEILLANCE IMPORTS :", e)
+            self._arret.wait(self.intervalle)
+
+    def demarrer(self):
+        """Lance le thread (une fois par processus, y compris après un fork)."""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._verrou = None  # le verrou du processus parent ne vaut pas pour celui-ci
+            self._arret.clear()
+            threading.Thread(target=self.boucle, name="surveillance-imports", daemon=True).start()
+
+    def arreter(self):
+        self._arret.set()
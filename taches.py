@@ -0,0 +1,252 @@
+"""
+File de tâches locale (thread de fond, sans broker externe).
+
+Les imports, allocations et re-validations sont soumis ici pour que les
+requêtes HTTP rendent la main immédiatement. Une tâche identique encore en
+attente (même clé) n'est pas dupliquée : la soumission renvoie son id.
+
+Avec un `dossier` partagé, l'état des tâches est aussi écrit dans
+<dossier>/taches.json (par le coordinateur) : chaque worker gunicorn exécute
+ses propres tâches, mais n'importe lequel répond sur l'état d'une tâche, et
+une tâche de même clé en attente dans un autre worker n'est pas dupliquée.
+"""
+
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+import traceback
+
+from coordination import coordinateur, lire_json
+
+EN_ATTENTE = "en_attente"
+EN_COURS = "en_cours"
+TERMINEE = "terminee"
+ERREUR = "erreur"
+FICHIER = "taches.json"
+
+
+def _vivant(pid):
+    """Le worker qui porte la tâche tourne-t-il encore ?"""
+    if os.name == "nt":  # os.kill(pid, 0) y terminerait le processus
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Tache:
+
+    def __init__(self, id, type, fonction, args, kwargs, cle):
+        self.id = id
+        self.type = type
+        self.cle = cle
+        self.fonction = fonction
+        self.args = args
+        self.kwargs = kwargs
+        self.statut = EN_ATTENTE
+        self.progression = 0.0
+        self.message = ""
+        self.resultat = None
+        self.soumise = time.time()
+        self.debut = None
+        self.fin = None
+        self.publier = None  # fonction(tache) : recopie dans l'état partagé
+
+    def avancer(self, progression, message=""):
+        self.progression = max(0.0, min(1.0, progression))
+        if message:
+            self.message = message
+        if self.publier is not None:
+            self.publier(self)
+
+    def en_dict(self):
+        return {
+            "id": self.id,
+            "type": self.type,
+            "statut": self.statut,
+            "progression": round(self.progression, 3),
+            "message": self.message,
+            "resultat": self.resultat,
+            "soumise": self.soumise,
+            "debut": self.debut,
+            "fin": self.fin
+        }
+
+
+class FileTaches:
+
+    def __init__(self, historique=200, dossier=None):
+        self.historique = historique
+        self.dossier = dossier  # état partagé entre processus, ou None
+        self._lock = threading.Lock()
+        self._compteur = itertools.count(1)
+        self._taches = {}       # {id: Tache}, dans l'ordre de soumission
+        self._en_attente = {}   # {cle: id} des tâches pas encore démarrées
+        self._file = None
+        self._thread = None
+        self._pid = None
+
+    def _demarrer(self):
+        # démarrage paresseux, et à nouveau après un fork (workers gunicorn)
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        if self.dossier is not None:
+            os.makedirs(self.dossier, exist_ok=True)
+            if self._pid is not None and self._pid != os.getpid():
+                # tâches du processus parent : il les exécute lui-même
+                self._taches = {}
+        self._pid = os.getpid()
+        self._file = queue.Queue()
+        self._en_attente = {}
+        for t in self._taches.values():
+            if t.statut == EN_ATTENTE:
+                self._file.put(t)
+                if t.cle is not None:
+                    self._en_attente[t.cle] = t.id
+        self._thread = threading.Thread(target=self._boucle, name="taches", daemon=True)
+        self._thread.start()
+
+    def soumettre(self, type, fonction, *args, cle=None, **kwargs):
+        """
+        Place fonction(tache, *args, **kwargs) dans la file et retourne l'id.
+        Si une tâche de même clé attend encore, c'est son id qui est retourné.
+        """
+        with self._lock:
+            self._demarrer()
+
+            if cle is not None and cle in self._en_attente:
+                return self._en_attente[cle]
+
+            tache = Tache(f"{os.getpid()}-{next(self._compteur)}", type, fonction, args, kwargs, cle)
+            if self.dossier is not None:
+                id = self._inscrire(tache)
+                if id != tache.id:
+                    return id  # en attente dans un autre worker
+                tache.publier = self._publier
+            self._taches[tache.id] = tache
+            if cle is not None:
+                self._en_attente[cle] = tache.id
+
+            while len(self._taches) > self.historique:
+                ancienne = next(iter(self._taches.values()))
+                if ancienne.statut in (EN_ATTENTE, EN_COURS):
+                    break
+                del self._taches[ancienne.id]
+
+            self._file.put(tache)
+            return tache.id
+
+    def etat(self, id):
+        if self.dossier is not None:
+            partagee = self._partagees().get(id)
+            if partagee is not None:
+                return _publique(partagee)
+        tache = self._taches.get(id)
+        return tache.en_dict() if tache else None
+
+    def liste(self):
+        if self.dossier is not None:
+            return [_publique(t) for t in reversed(list(self._partagees().values()))]
+        return [t.en_dict() for t in reversed(list(self._taches.values()))]
+
+    # ----------------------
+    # état partagé
+    # ----------------------
+
+    def _partagees(self):
+        return lire_json(os.path.join(self.dossier, FICHIER), {}).get("taches", {})
+
+    def _inscrire(self, tache):
+        """
+        Inscrit la tâche dans l'état partagé et lui donne un id unique entre
+        processus ; retourne l'id d'une tâche de même clé déjà en attente
+        dans un worker vivant, s'il y en a une.
+        """
+        cle = json.dumps(tache.cle) if tache.cle is not None else None
+
+        def inscrire(partage):
+            taches = partage.setdefault("taches", {})
+            if cle is not None:
+                for t in taches.values():
+                    if t["cle"] == cle and t["statut"] == EN_ATTENTE and _vivant(t["pid"]):
+                        return t["id"]
+
+            partage["suivant"] = partage.get("suivant", 0) + 1
+            tache.id = str(partage["suivant"])
+            taches[tache.id] = {**tache.en_dict(), "cle": cle, "pid": os.getpid()}
+
+            for id in list(taches)[:-self.historique]:
+                t = taches[id]
+                if t["statut"] in (TERMINEE, ERREUR) or not _vivant(t["pid"]):
+                    del taches[id]
+            return tache.id
+
+        return coordinateur.modifier(self.dossier, FICHIER, inscrire, {})
+
+    def _publier(self, tache):
+        etat = tache.en_dict()
+
+        def publier(partage):
+            t = partage.get("taches", {}).get(tache.id)
+            if t is not None:
+                t.update(etat)
+
+        coordinateur.modifier(self.dossier, FICHIER, publier, {})
+
+    def _boucle(self):
+        file = self._file
+        while True:
+            tache = file.get()
+            with self._lock:
+                if tache.cle is not None and self._en_attente.get(tache.cle) == tache.id:
+                    del self._en_attente[tache.cle]
+                tache.statut = EN_COURS
+                tache.debut = time.time()
+
+            try:
+                # publiée avant de commencer : une soumission de même clé
+                # arrivée entre-temps dans un autre worker crée sa propre tâche
+                if tache.publier is not None:
+                    tache.publier(tache)
+                tache.resultat = tache.fonction(tache, *tache.args, **tache.kwargs)
+                tache.statut = TERMINEE
+                tache.progression = 1.0
+            except Exception as e:
+                traceback.print_exc()
+                tache.statut = ERREUR
+                tache.message = str(e)
+            finally:
+                tache.fin = time.time()
+                if tache.publier is not None:
+                    try:
+                        tache.publier(tache)
+                    except Exception:
+                        traceback.print_exc()
+                file.task_done()
+
+    def attendre(self, timeout=None):
+        """Attend que la file soit vide (tests, arrêt propre)."""
+        limite = None if timeout is None else time.time() + timeout
+        while True:
+            with self._lock:
+                actives = [t for t in self._taches.values() if t.statut in (EN_ATTENTE, EN_COURS)]
+            if not actives:
+                return True
+            if limite is not None and time.time() > limite:
+                return False
+            time.sleep(0.05)
+
+
+def _publique(t):
+    """Entrée de l'état partagé telle que renvoyée par etat() / liste()."""
+    publique = {k: v for k, v in t.items() if k not in ("cle", "pid")}
+    if publique["statut"] in (EN_ATTENTE, EN_COURS) and not _vivant(t["pid"]):
+        publique.update(statut=ERREUR, message="worker arrêté avant la fin de la tâche")
+    return publique
@@ -1,10 +1,10 @@
 import json, os
 from app import charger_salles, safe_json, generer_salles_automatiques, to_minutes
+from stockage import stock
 
 base = os.path.join('data', 'output', '2025-2026')
-cours_path = os.path.join(base, 'cours_planifies.json')
 
-cours = safe_json(cours_path, [])
+cours = [dict(c) for c in stock(base).cours()]
 salles = charger_salles()
 effectifs = safe_json(os.path.join(base, 'effectifs.json'), {})
 access = safe_json(os.path.join(base, 'accessibilite.json'), {})
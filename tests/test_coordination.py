@@ -0,0 +1,76 @@
+import multiprocessing
+import os
+import threading
+
+import pytest
+
+import coordination
+from coordination import coordinateur, lire_json, version
+
+ECRIVAINS = 8
+ECRITURES = 25
+
+
+def incrementer(dossier, nom, n):
+    def ajouter(compteur):
+        compteur["total"] = compteur.get("total", 0) + 1
+        compteur.setdefault("auteurs", []).append(nom)
+    for _ in range(n):
+        coordinateur.modifier(dossier, "compteur.json", ajouter, {})
+
+
+def test_modifications_concurrentes_threads(tmp_path):
+    dossier = str(tmp_path)
+    threads = [
+        threading.Thread(target=incrementer, args=(dossier, f"t{i}", ECRITURES))
+        for i in range(ECRIVAINS)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    compteur = lire_json(os.path.join(dossier, "compteur.json"), {})
+    assert compteur["total"] == ECRIVAINS * ECRITURES
+    for i in range(ECRIVAINS):
+        assert compteur["auteurs"].count(f"t{i}") == ECRITURES
+    # regroupement : au plus une version par modification
+    assert 0 < version(dossier) <= ECRIVAINS * ECRITURES
+
+
+@pytest.mark.skipif(coordination.fcntl is None, reason="verrou entre processus indisponible")
+def test_modifications_concurrentes_processus(tmp_path):
+    dossier = str(tmp_path)
+    contexte = multiprocessing.get_context("spawn")
+    processus = [
+        contexte.Process(target=incrementer, args=(dossier, f"p{i}", ECRITURES))
+        for i in range(4)
+    ]
+    for p in processus:
+        p.start()
+    incrementer(dossier, "parent", ECRITURES)
+    for p in processus:
+        p.join(60)
+        assert p.exitcode == 0
+
+    compteur = lire_json(os.path.join(dossier, "compteur.json"), {})
+    assert compteur["total"] == 5 * ECRITURES
+    assert sorted(set(compteur["auteurs"])) == ["p0", "p1", "p2", "p3", "parent"]
+
+
+def test_erreur_isolee_dans_le_lot(tmp_path):
+    dossier = str(tmp_path)
+
+    def echouer(donnees):
+        raise ValueError("refusé")
+
+    with pytest.raises(ValueError):
+        coordinateur.modifier(dossier, "a.json", echouer, {})
+    assert coordinateur.modifier(dossier, "a.json", lambda d: d.update(x=1), {}) is None
+    assert lire_json(os.path.join(dossier, "a.json"), {}) == {"x": 1}
+
+
+def test_transaction_voit_les_modifications_precedentes(tmp_path):
+    dossier = str(tmp_path)
+    coordinateur.modifier(dossier, "a.json", lambda d: d.update(x=1), {})
+    assert coordinateur.executer(dossier, lambda: lire_json(os.path.join(dossier, "a.json"), {})) == {"x": 1}
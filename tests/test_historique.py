@@ -0,0 +1,103 @@
+import random
+
+import pytest
+
+import historique
+from stockage import Stock
+
+
+def cours(jour, heure, matiere="MATHS", formation="SIO 1", salle=None):
+    return {
+        "date": f"2025-09-{jour:02d}",
+        "heure_debut": f"{heure:02d}h00",
+        "heure_fin": f"{heure + 2:02d}h00",
+        "formation": formation,
+        "matiere_nom": matiere,
+        "salle": salle
+    }
+
+
+def variante(liste, rng):
+    """Ajouts, retraits, doublons et changements de salle au hasard."""
+    nouvelle = [dict(c) for c in liste]
+    for _ in range(rng.randint(0, 6)):
+        action = rng.choice(("ajout", "retrait", "salle", "doublon"))
+        if action == "ajout":
+            nouvelle.insert(rng.randint(0, len(nouvelle)), cours(rng.randint(1, 28), rng.choice((8, 10, 14)), rng.choice("ABC")))
+        elif nouvelle and action == "retrait":
+            del nouvelle[rng.randrange(len(nouvelle))]
+        elif nouvelle and action == "salle":
+            nouvelle[rng.randrange(len(nouvelle))]["salle"] = rng.choice((None, "B1", "B2", "A10"))
+        elif nouvelle:
+            nouvelle.append(dict(rng.choice(nouvelle)))
+    return nouvelle
+
+
+def test_restaurer_difference_aller_retour():
+    rng = random.Random(2025)
+    for _ in range(300):
+        avant = variante([], rng) + variante([cours(j, 8) for j in range(1, 6)], rng)
+        apres = variante(avant, rng)
+        diff = historique.difference(avant, apres)
+        if diff is None:
+            assert avant == apres
+            continue
+        assert historique.restaurer(apres, diff) == avant
+
+
+def test_difference_salles_seules():
+    avant = [cours(1, 8, salle="B1"), cours(1, 14)]
+    apres = [cours(1, 8, salle="B2"), cours(1, 14, salle="A10")]
+    diff = historique.difference(avant, apres)
+    assert historique.resume(diff) == {"ajoutes": 0, "retires": 0, "salles": 2}
+    assert historique.restaurer(apres, diff) == avant
+
+
+def test_difference_identiques():
+    liste = [cours(1, 8, salle="B1")]
+    assert historique.difference(liste, [dict(c) for c in liste]) is None
+    assert historique.difference([], []) is None
+
+
+@pytest.fixture
+def stock(tmp_path):
+    return Stock(str(tmp_path))
+
+
+def test_retour_apres_suppression_et_reimport(stock):
+    sio = [cours(j, 8) for j in range(1, 4)]
+    ndrc = [cours(j, 10, formation="NDRC 1") for j in range(1, 3)]
+
+    stock.remplacer_formation("SIO 1", sio, source="sio.csv")      # 1
+    stock.remplacer_formation("NDRC 1", ndrc, source="ndrc.csv")   # 2
+
+    def attribuer(liste):
+        for c in liste:
+            c["salle"] = "B1"
+    stock.modifier(attribuer, formations={"SIO 1"})                 # 3
+    avec_salles = stock.partition("SIO 1")
+    assert [c["salle"] for c in avec_salles] == ["B1"] * 3
+
+    stock.supprimer_formation("SIO 1")                              # 4
+    assert "SIO 1" not in stock.manifeste()
+    reimport = [cours(j, 14) for j in range(5, 9)]
+    stock.remplacer_formation("SIO 1", reimport, source="sio.csv")  # 5
+
+    assert stock.restaurer(3) == 6
+    assert stock.partition("SIO 1") == avec_salles
+    assert stock.manifeste()["SIO 1"]["sans_salle"] == 0
+    assert stock.partition("NDRC 1") == ndrc
+
+    # le retour est lui-même une version que l'on peut défaire
+    assert stock.restaurer(5) == 7
+    assert stock.partition("SIO 1") == reimport
+
+    stock.restaurer(0)
+    assert stock.manifeste() == {}
+    assert [v["n"] for v in stock.historique()] == list(range(1, 9))
+
+
+def test_retour_version_inconnue(stock):
+    stock.remplacer_formation("SIO 1", [cours(1, 8)])
+    assert stock.restaurer(5) is None
+    assert len(stock.partition("SIO 1")) == 1
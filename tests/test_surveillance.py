@@ -0,0 +1,135 @@
+import os
+
+import pytest
+
+from stockage import hash_fichier
+from surveillance import Surveillant
+
+
+class Appels:
+
+    def __init__(self, connues=None):
+        self.ingeres = []
+        self.retires = []
+        self._connues = connues or {}
+
+    def ingerer(self, chemin, empreinte):
+        self.ingeres.append((os.path.basename(chemin), empreinte))
+
+    def retirer(self, nom):
+        self.retires.append(nom)
+
+    def connues(self):
+        return dict(self._connues)
+
+
+def ecrire(dossier, nom, contenu):
+    with open(os.path.join(dossier, nom), "w", encoding="utf-8") as f:
+        f.write(contenu)
+
+
+def surveillant(dossier, appels, **options):
+    return Surveillant(str(dossier), appels.ingerer, appels.retirer, appels.connues, delai=3.0, **options)
+
+
+@pytest.fixture
+def appels():
+    return Appels()
+
+
+def test_fichier_stable_ingere_une_fois(tmp_path, appels):
+    s = surveillant(tmp_path, appels)
+    ecrire(tmp_path, "SIO 1.csv", "a;b\n")
+
+    assert s.scanner(maintenant=0) == ([], [])     # vu pour la première fois
+    assert s.scanner(maintenant=2) == ([], [])     # pas encore stable
+    assert s.scanner(maintenant=3) == (["SIO 1.csv"], [])
+    assert s.scanner(maintenant=10) == ([], [])    # déjà traité
+    assert appels.ingeres == [("SIO 1.csv", hash_fichier(str(tmp_path / "SIO 1.csv")))]
+
+
+def test_ecriture_en_cours_repousse_l_import(tmp_path, appels):
+    s = surveillant(tmp_path, appels)
+    ecrire(tmp_path, "SIO 1.csv", "a;b\n")
+    s.scanner(maintenant=0)
+    ecrire(tmp_path, "SIO 1.csv", "a;b\nc;d\n")    # la taille change : délai relancé
+    assert s.scanner(maintenant=2) == ([], [])
+    assert s.scanner(maintenant=4) == ([], [])
+    assert s.scanner(maintenant=5) == (["SIO 1.csv"], [])
+    assert len(appels.ingeres) == 1
+
+
+def test_modification_et_contenu_inchange(tmp_path, appels):
+    s = surveillant(tmp_path, appels)
+    chemin = tmp_path / "SIO 1.csv"
+    ecrire(tmp_path, "SIO 1.csv", "a;b\n")
+    s.scanner(maintenant=0)
+    s.scanner(maintenant=3)
+
+    # même contenu réécrit (nouvelle date) : pas de nouvel import
+    os.utime(chemin, ns=(0, os.stat(chemin).st_mtime_ns + 10**9))
+    s.scanner(maintenant=4)
+    assert s.scanner(maintenant=7) == ([], [])
+
+    ecrire(tmp_path, "SIO 1.csv", "a;b;c\n")
+    s.scanner(maintenant=8)
+    assert s.scanner(maintenant=11) == (["SIO 1.csv"], [])
+    assert len(appels.ingeres) == 2
+
+
+def test_retrait(tmp_path, appels):
+    s = surveillant(tmp_path, appels)
+    ecrire(tmp_path, "SIO 1.csv", "a;b\n")
+    s.scanner(maintenant=0)
+    s.scanner(maintenant=3)
+
+    os.remove(tmp_path / "SIO 1.csv")
+    assert s.scanner(maintenant=4) == ([], ["SIO 1.csv"])
+    assert s.scanner(maintenant=5) == ([], [])
+    assert appels.retires == ["SIO 1.csv"]
+
+
+def test_retrait_d_un_fichier_jamais_importe(tmp_path, appels):
+    s = surveillant(tmp_path, appels)
+    ecrire(tmp_path, "SIO 1.csv", "a;b\n")
+    s.scanner(maintenant=0)
+    os.remove(tmp_path / "SIO 1.csv")
+    assert s.scanner(maintenant=1) == ([], [])
+
+
+def test_reference_au_demarrage(tmp_path):
+    ecrire(tmp_path, "SIO 1.csv", "a;b\n")
+    ecrire(tmp_path, "NDRC 1.csv", "a;b\n")
+    appels = Appels(connues={
+        "SIO 1.csv": hash_fichier(str(tmp_path / "SIO 1.csv")),
+        "NDRC 1.csv": "empreinte d'une ancienne version",
+        "MCO 1.csv": "supprimé pendant l'arrêt",
+    })
+    s = surveillant(tmp_path, appels)
+    s.scanner(maintenant=0)
+    assert s.scanner(maintenant=3) == (["NDRC 1.csv"], [])
+    # un fichier connu mais absent n'est signalé qu'une fois vu puis disparu
+    assert appels.retires == []
+
+
+def test_fichiers_exclus(tmp_path):
+    import app
+
+    ecrire(tmp_path, "anniversaires.csv", "nom;prenom;date\n")
+    ecrire(tmp_path, "notes.txt", "x")
+    ecrire(tmp_path, "SIO 1.csv", "a;b\n")
+    appels = Appels(connues={"anniversaires.csv": "ancienne"})
+    s = surveillant(tmp_path, appels, retenir=app.est_emploi_du_temps)
+
+    s.scanner(maintenant=0)
+    assert s.scanner(maintenant=3) == (["SIO 1.csv"], [])
+    ecrire(tmp_path, "anniversaires.csv", "nom;prenom;date\nA;B;01/01/2000\n")
+    s.scanner(maintenant=4)
+    assert s.scanner(maintenant=8) == ([], [])
+    os.remove(tmp_path / "anniversaires.csv")
+    assert s.scanner(maintenant=9) == ([], [])
+    assert [n for n, _ in appels.ingeres] == ["SIO 1.csv"]
+
+    assert app.importer_fichier(str(tmp_path / "anniversaires.csv")) is None
+    assert not app.est_emploi_du_temps("Anniversaires.CSV")
+    assert app.est_emploi_du_temps("Emplois du temps 2025-2026 - SIO 1.csv")